@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+#
+# Benchmarks for Scope dump Pro. Each benchmark exercises one part of the utility in isolation so
+# that the numbers can be compared between revisions or configurations. Run with -h for a list.
+#
+# throughput    replays a recorded dump through a pty and compares the old per-byte capture loop
+#               with the chunked capture into the job buffer used by SerialListener (bytes/s and
+#               CPU time)
+# latency       feeds bursts of data into a job buffer and measures the time from the last byte
+#               until the job is considered complete, for the old sleep-and-compare loop and the
+#               event driven detector used by SerialListener.timerRun
+# phosphor      applies the phosphor look to a PNG with ImageMagick and natively, compares the results
+#               pixel by pixel and reports the time taken by both
+# logger        log calls per second with the terminal size queried through stty for every line and
+#               with the cached geometry and log queue used by Logger
+# imports       time and peak resident memory to import scope_dump_pro in headless mode and with
+#               the GUI modules loaded, each in a fresh interpreter
+# startup       starts scope_dump_pro headless on a pty and measures how long it takes until data is
+#               captured, and until the startup commands have been sent
+# raster        renders a recorded raster screen dump with PCL_BINARY and with the native decoder
+#               used by Trace.renderRaster
+# hpgl          renders a recorded HP-GL plot with PCL_BINARY and with the native plotter used by
+#               Trace.renderPlot
+# formats       renders a recorded raster screen dump or HP-GL plot natively to PDF, PNG and a thumbnail,
+#               once per format and once from a shared image as Trace.renderFile does
+# catalog       fills a trace catalog with synthetic jobs and times recording and the queries used
+#               by -q and the trace browser
+#
+# PelliX 2024
+#
+import os
+import random
+import pty
+import select
+import tty
+import time
+import sys
+import shlex
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import statistics
+import concurrent.futures
+from threading import Thread, Event
+
+import scope_dump_pro
+
+# load a recorded dump, or generate some PCL-like noise if none was given
+def loadDump(file_name, size=65536):
+    if file_name:
+        with open(file_name, 'rb') as dump:
+            return dump.read()
+    return b'\x1bE\x1b*r0A' + os.urandom(size) + b'\x1b*rB\x1bE'
+
+# write the dump to the pty master, paced at the given baud rate (10 bits per byte) or unpaced
+def replayDump(master, data, rate):
+    block = 64
+    for offset in range(0, len(data), block):
+        os.write(master, data[offset:offset + block])
+        if rate:
+            time.sleep(block * 10 / rate)
+
+# the capture loop as it was before chunked reads: one read, write and flush per byte
+def perByte(listener, dumpfile):
+    databyte = listener.ser.read(1)
+    dumpfile.write(databyte)
+    dumpfile.flush()
+    return len(databyte)
+
+# replay the dump through a pty and capture it using the given read function
+def runCapture(data, rate, reader):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    results = {}
+    with tempfile.NamedTemporaryFile() as dumpfile:
+        listener = scope_dump_pro.SerialListener(port=os.ttyname(slave), speed=115200, bufferfile=dumpfile.name, logger=None)
+
+        # measure in the capture thread so the writer does not show up in the CPU time
+        def capture():
+            received = 0
+            start_wall = time.monotonic()
+            start_cpu = time.thread_time()
+            while received < len(data):
+                received += reader(listener, dumpfile)
+            results['wall'] = time.monotonic() - start_wall
+            results['cpu'] = time.thread_time() - start_cpu
+
+        ct = Thread(target=capture)
+        ct.start()
+        replayDump(master, data, rate)
+        ct.join()
+        listener.ser.close()
+    os.close(master)
+    os.close(slave)
+    return results
+
+# compare the per-byte loop with the chunked capture
+def benchThroughput(args):
+    data = loadDump(args.i)
+    if args.c:
+        scope_dump_pro.CAPTURE_CHUNK = args.c
+    print("Replaying " + str(len(data)) + " bytes " + ("at " + str(args.r) + " baud" if args.r else "unpaced"))
+    for name, reader in (('per-byte', perByte), ('chunked', lambda listener, dumpfile: listener.captureChunk())):
+        results = runCapture(data, args.r, reader)
+        print('{:<10} {:>12.0f} bytes/s {:>8.3f}s CPU {:>6.1f}% of wall time'.format(name,
+            len(data) / results['wall'], results['cpu'], 100 * results['cpu'] / results['wall']))
+
+# the end-of-job detection as it was before: sleep TIMEOUT_S and compare the job size
+def legacyComplete(buffer, timeout):
+    while True:
+        size_first_check = buffer.size
+        time.sleep(timeout)
+        size_last_check = buffer.size
+        if size_last_check != 0 and size_last_check == size_first_check:
+            return time.monotonic() - buffer.last_byte
+
+# feed a number of jobs into a job buffer and measure last byte to completion latency
+def runDetector(detector, jobs, timeout):
+    latencies = []
+    buffer = scope_dump_pro.JobBuffer('/dev/null', logger=None)
+    for job in range(jobs):
+        done = Event()
+
+        def detect():
+            latencies.append(detector(buffer, timeout))
+            done.set()
+
+        dt = Thread(target=detect)
+        dt.start()
+        # a job is a few bursts with gaps shorter than the timeout
+        time.sleep(random.uniform(0, timeout))
+        for burst in range(random.randint(1, 5)):
+            buffer.append(os.urandom(256))
+            time.sleep(random.uniform(0, timeout / 2))
+        done.wait()
+        dt.join()
+        buffer.clear()
+    return latencies
+
+# the event driven detector, the clock is read once it has returned the job
+def eventComplete(buffer, timeout):
+    job = buffer.waitComplete(timeout, Event(), lambda state: None)
+    return time.monotonic() - job.last_byte
+
+# compare the sleep-and-compare loop with the event driven detector
+def benchLatency(args):
+    random.seed(args.seed)
+    print("Measuring " + str(args.j) + " jobs with a " + str(args.t) + "s timeout")
+    for name, detector in (('legacy', legacyComplete), ('event', eventComplete)):
+        latencies = runDetector(detector, args.j, args.t)
+        print('{:<10} min {:>7.3f}s mean {:>7.3f}s max {:>7.3f}s'.format(name,
+            min(latencies), sum(latencies) / len(latencies), max(latencies)))
+
+# compare the ImageMagick phosphor conversion with the native one
+def benchPhosphor(args):
+    scope_dump_pro.loadImaging()
+    with tempfile.TemporaryDirectory() as workdir:
+        magick_file = os.path.join(workdir, 'magick.png')
+        native_file = os.path.join(workdir, 'native.png')
+        start = time.monotonic()
+        for run in range(args.n):
+            subprocess.run([scope_dump_pro.PNG_PHOSPHOR_CMD, args.i] + shlex.split(scope_dump_pro.PNG_PHOSPHOR_ARGS) + [magick_file], check=True)
+        magick_time = (time.monotonic() - start) / args.n
+        trace = scope_dump_pro.Trace()
+        start = time.monotonic()
+        for run in range(args.n):
+            with scope_dump_pro.Image.open(args.i) as image:
+                trace.phosphorImage(image).save(native_file)
+        native_time = (time.monotonic() - start) / args.n
+        with scope_dump_pro.Image.open(magick_file) as magick, scope_dump_pro.Image.open(native_file) as native:
+            difference = abs(scope_dump_pro.numpy.asarray(magick.convert('RGBA'), dtype=int) - scope_dump_pro.numpy.asarray(native.convert('RGBA'), dtype=int))
+    print('{:<10} {:>8.3f}s per image'.format('magick', magick_time))
+    print('{:<10} {:>8.3f}s per image'.format('native', native_time))
+    print("Largest difference " + str(difference.max()) + ", " + str(int((difference.max(axis=2) > args.t).sum())) + " of " + str(difference.shape[0] * difference.shape[1]) + " pixels differ by more than " + str(args.t))
+    if difference.max() > args.t:
+        sys.exit(1)
+
+# console output as it was before the terminal geometry was cached
+def legacyPrint(text_string, animateDots):
+    rows, columns = os.popen('stty size', 'r').read().split()
+    justify_string = '{:<' + str(int(columns)-1) + '}'
+    if animateDots == True:
+        blank_string = ''
+        i = 0
+        while i < int(columns):
+            blank_string += ' '
+            i += 1
+        print(justify_string.format(blank_string), end='\r')
+        seconds = int(time.strftime("%S")[-1:])
+        dots = '.'
+        i = 1
+        while i < seconds:
+            dots += '.'
+            i += 1
+        print(justify_string.format(text_string + dots), end='\r', flush=True)
+    else:
+        print(justify_string.format(text_string), flush=True, end='\r\n')
+
+# count log calls per second for a given print function, with output discarded
+def runLogger(printer, duration, settle=lambda: None):
+    calls = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            printer("Receiving data (" + str(calls) + " bytes).", calls % 2 == 0)
+            calls += 1
+        elapsed = time.monotonic() - start
+        settle()
+    return calls / elapsed
+
+# compare log calls per second with and without cached terminal geometry
+def benchLogger(args):
+    scope_dump_pro.NATIVE_LOGGER = False
+    logger = scope_dump_pro.Logger(gui=None)
+    printers = [('cached', lambda text_string, animateDots: logger.printConsole(text_string, newLine=not animateDots, animateDots=animateDots), logger.flush)]
+    if os.isatty(sys.stdin.fileno()):
+        printers.insert(0, ('stty', legacyPrint, lambda: None))
+    else:
+        print("Standard input is not a terminal, skipping the stty variant")
+    for name, printer, settle in printers:
+        print('{:<10} {:>12.0f} calls/s'.format(name, runLogger(printer, args.t, settle)))
+
+# import the utility in a fresh interpreter and report the import time and peak memory use
+def runImport(load):
+    code = "import time, resource; start = time.perf_counter(); import scope_dump_pro; " + load + \
+        "; print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True).stdout
+    seconds, maxrss = output.split()[-2:]
+    return float(seconds), int(maxrss)
+
+# compare the import cost of headless mode with that of the GUI
+def benchImports(args):
+    for name, load in (('headless', 'pass'), ('gui', 'scope_dump_pro.loadGUI()')):
+        results = [runImport(load) for run in range(args.n)]
+        print('{:<10} {:>8.1f}ms median import {:>8.1f}MiB peak RSS'.format(name,
+            1000 * statistics.median(result[0] for result in results), max(result[1] for result in results) / 1024))
+
+# start the utility headless on a pty and note when the given messages first show up in its output
+def runStartup(markers, timeout):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    seen = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scope_dump_pro.py')
+        start = time.monotonic()
+        process = subprocess.Popen([sys.executable, script, '-d', '-p', os.ttyname(slave), '-f', os.path.join(workdir, 'scope.dump'), '-o', workdir],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        output = b''
+        while len(seen) < len(markers):
+            # wait for output no longer than the timeout allows, the utility may never print a marker
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0 or not select.select([process.stdout], [], [], remaining)[0]:
+                break
+            chunk = os.read(process.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            output += chunk
+            for name, marker in markers:
+                if name not in seen and marker in output:
+                    seen[name] = time.monotonic() - start
+                    # send some data once the listener runs, the utility reports it when it arrives
+                    if name == 'listener':
+                        os.write(master, b'PCL' * 64)
+        process.terminate()
+        process.wait()
+    os.close(master)
+    os.close(slave)
+    return seen
+
+# measure the time until capture and until the startup commands are done
+def benchStartup(args):
+    commands = len(scope_dump_pro.COMMANDS_STARTUP)
+    markers = [('listener', b'Starting serial listener thread'), ('first data', b'Receiving data'), ('commands', b'Startup commands sent')]
+    print(str(commands) + " startup commands with a " + str(scope_dump_pro.COMMANDS_DELAY) + "s delay, capture used to start after " + '{:.1f}'.format(commands * scope_dump_pro.COMMANDS_DELAY) + "s")
+    for run in range(args.n):
+        seen = runStartup(markers, args.t)
+        print(' '.join('{} {:>7.3f}s'.format(name, seen[name]) if name in seen else name + ' not seen' for name, marker in markers))
+
+# compare rendering a raster screen dump with PCL_BINARY and with the native decoder
+def benchRaster(args):
+    scope_dump_pro.loadImaging()
+    data = loadDump(args.i)
+    start = time.monotonic()
+    bitmap = scope_dump_pro.PCLRaster().decode(data)
+    if bitmap is None:
+        print("Dump is not a raster-only PCL job, the native decoder would pass it on to " + scope_dump_pro.PCL_BINARY)
+        sys.exit(1)
+    print("Decoded a " + str(bitmap.shape[1]) + "x" + str(bitmap.shape[0]) + " raster in " + '{:.3f}'.format(time.monotonic() - start) + "s")
+    with tempfile.TemporaryDirectory() as workdir:
+        gpcl_file = os.path.join(workdir, 'gpcl.png')
+        native_file = os.path.join(workdir, 'native.png')
+        if os.access(scope_dump_pro.PCL_BINARY, os.X_OK):
+            render_command = [scope_dump_pro.PCL_BINARY] + shlex.split(scope_dump_pro.PCL_ARGS) + [gpcl_file] + shlex.split(scope_dump_pro.PCL_STDIN)
+            start = time.monotonic()
+            for run in range(args.n):
+                subprocess.run(render_command, input=data, stdout=subprocess.DEVNULL, check=True)
+            print('{:<10} {:>8.3f}s per job'.format('gpcl6', (time.monotonic() - start) / args.n))
+        else:
+            print(scope_dump_pro.PCL_BINARY + " not found, skipping it")
+        start = time.monotonic()
+        for run in range(args.n):
+            raster = scope_dump_pro.PCLRaster()
+            bitmap = raster.decode(data)
+            image = scope_dump_pro.Image.fromarray(scope_dump_pro.numpy.where(bitmap, 0, 255).astype(scope_dump_pro.numpy.uint8), 'L')
+            image.save(native_file, 'PNG', dpi=(raster.resolution, raster.resolution))
+        print('{:<10} {:>8.3f}s per job'.format('native', (time.monotonic() - start) / args.n))
+
+# compare rendering an HP-GL plot with PCL_BINARY and with the native plotter
+def benchPlot(args):
+    scope_dump_pro.loadImaging()
+    data = loadDump(args.i)
+    start = time.monotonic()
+    lexer = scope_dump_pro.HPGLLexer()
+    lexer.feed(data)
+    commands = []
+    for job in range(len(lexer.finished) + 1):
+        commands += lexer.takeCommands()
+    print("Parsed " + str(len(commands)) + " commands in " + '{:.3f}'.format(time.monotonic() - start) + "s")
+    if not scope_dump_pro.HPGLPlot().interpret(commands):
+        print("Dump uses commands the native plotter does not support, it would pass it on to " + scope_dump_pro.PCL_BINARY)
+        sys.exit(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        if os.access(scope_dump_pro.PCL_BINARY, os.X_OK):
+            render_command = [scope_dump_pro.PCL_BINARY] + shlex.split(scope_dump_pro.PCL_ARGS) + [os.path.join(workdir, 'gpcl')] + shlex.split(scope_dump_pro.PCL_STDIN)
+            start = time.monotonic()
+            for run in range(args.n):
+                subprocess.run(render_command, input=data, stdout=subprocess.DEVNULL, check=True)
+            print('{:<10} {:>8.3f}s per job'.format('gpcl6', (time.monotonic() - start) / args.n))
+        else:
+            print(scope_dump_pro.PCL_BINARY + " not found, skipping it")
+        for name in ('png', 'svg'):
+            start = time.monotonic()
+            for run in range(args.n):
+                plot = scope_dump_pro.HPGLPlot()
+                plot.interpret(commands)
+                if name == 'png':
+                    plot.image(scope_dump_pro.HPGL_WIDTH, scope_dump_pro.HPGL_PENS)[0].save(os.path.join(workdir, 'native.png'))
+                else:
+                    with open(os.path.join(workdir, 'native.svg'), 'w') as svgfile:
+                        svgfile.write(plot.svg(scope_dump_pro.HPGL_PENS))
+            print('{:<10} {:>8.3f}s per job'.format('native ' + name, (time.monotonic() - start) / args.n))
+
+# discards log output of the utility
+class QuietLogger:
+
+    def printConsole(self, *args, **kwargs):
+        pass
+
+# render a job natively to the given formats in a scratch directory, returns the time taken
+def runFormats(data, language, commands, formats, queue):
+    with tempfile.TemporaryDirectory() as workdir:
+        scope_dump_pro.FILE_DIR = workdir
+        scope_dump_pro.CONV_FORMAT = [conv_format for conv_format in formats if conv_format != 'thumb']
+        scope_dump_pro.THUMB_SIZE = 256 if 'thumb' in formats else 0
+        start = time.monotonic()
+        futures = scope_dump_pro.Trace().renderFile(None, QuietLogger(), scope_dump_pro.Job(data=data, size=len(data), language=language, commands=commands), queue)
+        concurrent.futures.wait(futures)
+        return time.monotonic() - start
+
+# compare rendering each format on its own with rendering them all from one decoded image
+def benchFormats(args):
+    scope_dump_pro.loadImaging()
+    data = loadDump(args.i)
+    language = 'PCL'
+    commands = None
+    if scope_dump_pro.PCLRaster().decode(data) is None:
+        lexer = scope_dump_pro.HPGLLexer()
+        lexer.feed(data)
+        commands = []
+        for job in range(len(lexer.finished) + 1):
+            commands += lexer.takeCommands()
+        language = 'HP-GL'
+    scope_dump_pro.PREVIEW = False
+    formats = ['pdf', 'png', 'thumb']
+    queue = scope_dump_pro.RenderQueue(1, None)
+    separate = [sum(runFormats(data, language, commands, [conv_format], queue) for conv_format in formats) for run in range(args.n)]
+    shared = [runFormats(data, language, commands, formats, queue) for run in range(args.n)]
+    print("Rendering the " + language + " job to " + ", ".join(formats).upper())
+    print('{:<10} {:>8.3f}s per job'.format('separate', statistics.median(separate)))
+    print('{:<10} {:>8.3f}s per job'.format('shared', statistics.median(shared)))
+
+# fill a scratch trace catalog and time recording, listing the latest traces and filtering them
+def benchCatalog(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        catalog = scope_dump_pro.TraceCatalog(os.path.join(workdir, 'catalog.sqlite'))
+        ports = ['ttyUSB0', 'ttyUSB1', 'ttyACM0']
+        captured = time.time() - args.j
+        start = time.monotonic()
+        for job_id in range(args.j):
+            job = scope_dump_pro.Job(size=random.randint(1000, 100000), language=random.choice(['PCL', 'HP-GL']))
+            job.hash = '{:040x}'.format(random.getrandbits(160))
+            base_name = os.path.join(workdir, 'scope_output_' + str(job_id))
+            # only files that exist are recorded
+            open(base_name + '.pdf', 'w').close()
+            catalog.record(job, captured + job_id, random.choice(ports), random.random(), {'pdf': base_name + '.pdf'})
+        record_time = time.monotonic() - start
+        print("Recorded " + str(args.j) + " jobs at " + '{:.0f}'.format(args.j / record_time) + " jobs/s")
+        # common words fill a page from the newest jobs, rare ones scan the table unless they are a hash
+        for name, words in (('latest', []), ('port', ['ttyUSB1']), ('language', ['HP-GL', 'ttyACM0']), ('hash', [job.hash[:8]]), ('file', ['output_' + str(args.j // 2) + '.'])):
+            start = time.monotonic()
+            rows = catalog.query(words, limit=scope_dump_pro.CATALOG_LIMIT)
+            first_page = time.monotonic() - start
+            start = time.monotonic()
+            catalog.query(words, limit=scope_dump_pro.CATALOG_LIMIT, after=rows[-1] if rows else None)
+            next_page = time.monotonic() - start
+            print('{:<10} {:>8.1f}ms first page {:>8.1f}ms next page ({} rows)'.format(name, 1000 * first_page, 1000 * next_page, len(rows)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Scope dump benchmarks")
+    benchmarks = parser.add_subparsers(dest='benchmark', required=True)
+    throughput = benchmarks.add_parser('throughput', help="Serial capture throughput through a pty")
+    throughput.add_argument('-i', type=str, metavar='[/tmp/scope.dump]', help="Recorded dump to replay", required=False)
+    throughput.add_argument('-r', type=int, metavar='[baud]', help="Pace the replay at this rate, unpaced if omitted", required=False)
+    throughput.add_argument('-c', type=int, metavar='[bytes]', help="Override serial read chunk size", required=False)
+    throughput.set_defaults(run=benchThroughput)
+    latency = benchmarks.add_parser('latency', help="Last byte to job completion latency")
+    latency.add_argument('-j', type=int, metavar='[jobs]', help="Number of jobs to measure", default=10)
+    latency.add_argument('-t', type=float, metavar='[seconds]', help="Job timeout", default=scope_dump_pro.TIMEOUT_S)
+    latency.add_argument('--seed', type=int, help="Random seed for the burst pattern", default=0)
+    latency.set_defaults(run=benchLatency)
+    phosphor = benchmarks.add_parser('phosphor', help="Native phosphor conversion compared to ImageMagick")
+    phosphor.add_argument('-i', type=str, metavar='[trace.png]', help="PNG to convert", required=True)
+    phosphor.add_argument('-n', type=int, metavar='[runs]', help="Number of conversions to time", default=5)
+    phosphor.add_argument('-t', type=int, metavar='[levels]', help="Largest accepted difference per channel", default=2)
+    phosphor.set_defaults(run=benchPhosphor)
+    logger = benchmarks.add_parser('logger', help="Console log calls per second")
+    logger.add_argument('-t', type=float, metavar='[seconds]', help="Duration of each measurement", default=2.0)
+    logger.set_defaults(run=benchLogger)
+    imports = benchmarks.add_parser('imports', help="Import time and memory of headless mode and the GUI")
+    imports.add_argument('-n', type=int, metavar='[runs]', help="Number of interpreters to start per mode", default=5)
+    imports.set_defaults(run=benchImports)
+    startup = benchmarks.add_parser('startup', help="Time until capture starts, headless on a pty")
+    startup.add_argument('-n', type=int, metavar='[runs]', help="Number of times to start the utility", default=3)
+    startup.add_argument('-t', type=float, metavar='[seconds]', help="Give up on a run after this long", default=15.0)
+    startup.set_defaults(run=benchStartup)
+
+    raster = benchmarks.add_parser('raster', help="Raster screen dump rendering with PCL_BINARY and natively")
+    raster.add_argument('-i', type=str, metavar='[/tmp/scope.dump]', help="Recorded raster screen dump", required=True)
+    raster.add_argument('-n', type=int, metavar='[runs]', help="Number of renders to time", default=5)
+    raster.set_defaults(run=benchRaster)
+
+    hpgl = benchmarks.add_parser('hpgl', help="HP-GL plot rendering with PCL_BINARY and natively")
+    hpgl.add_argument('-i', type=str, metavar='[/tmp/scope.dump]', help="Recorded HP-GL plot", required=True)
+    hpgl.add_argument('-n', type=int, metavar='[runs]', help="Number of renders to time", default=5)
+    hpgl.set_defaults(run=benchPlot)
+
+    formats = benchmarks.add_parser('formats', help="Native rendering to several formats, separately and from a shared image")
+    formats.add_argument('-i', type=str, metavar='[/tmp/scope.dump]', help="Recorded raster screen dump or HP-GL plot", required=True)
+    formats.add_argument('-n', type=int, metavar='[runs]', help="Number of renders to time", default=5)
+    formats.set_defaults(run=benchFormats)
+
+    catalog = benchmarks.add_parser('catalog', help="Trace catalog recording and queries")
+    catalog.add_argument('-j', type=int, metavar='[jobs]', help="Number of jobs to record", default=200000)
+    catalog.set_defaults(run=benchCatalog)
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 #
 # This script opens a given serial port and waits for data. When data is received, it is dumped
-# to a file on disk byte by byte. The data in memory is flushed to disk after each byte to ensure
-# that the timer thread does not prematurely consider the print job to be complete. The delay after
+# to a file on disk in chunks of up to CAPTURE_CHUNK bytes. Each chunk is flushed to disk as soon as
+# it is read to ensure that the timer thread does not prematurely consider the print job to be complete. The delay after
 # which a job is finished can be set by adjusting TIMEOUT_S. Note that CTS/DTR and XON/XOF are not
 # handled or addressed currently. When a job is considered complete, a binary (gpcl6 from the
 # Ghostscript project is currently used) is called to convert the PCL datafile into a human
@@ -25,6 +25,8 @@ import argparse                     # optional arguments
 from threading import Thread, Event # support for timer, input and serial threads
 import subprocess                   # launch external commands
 import sys, termios, tty            # keyboard input together with os and time
+import shutil                       # terminal size
+import signal                       # terminal resize notifications
 
 # config parameters
 SERIAL_PORT = '/dev/ttyUSB0'                    # serial port to use
@@ -33,6 +35,8 @@ SERIAL_IGNORE = False                           # bypass attaching to the serial
 BUFFER_FILE = '/tmp/scope.dump'                 # data buffer file on disk
 KEEP_BUFFER = False                             # keep the buffer (disk only), can be used for debugging or batch jobs
 TIMEOUT_S = 2                                   # timeout before rendering job in seconds
+CAPTURE_CHUNK = 4096                            # maximum number of bytes read from the serial port at once
+CAPTURE_TIMEOUT = 0.05                          # read timeout in seconds after which a partially filled chunk is returned
 PCL_BINARY = '/usr/local/bin/gpcl6'             # binary called to convert the PCL dump to another format
 PCL_ARGS = '-sDEVICE=pdfwrite -o '              # optional arguments for above binary - use empty string for none
 #PCL_ARGS = '-sDEVICE=pngalpha -r128 -dGraphicsAlphaBits=4 -o '
@@ -46,11 +50,18 @@ PNG_PHOSPHOR_ARGS = "-alpha off -fill \"#00EE00\" -draw 'color 0,0 replace' +lev
 PREVIEW = True                                  # whether to automatically preview rendered files
 COMMANDS_STARTUP = ['++srqauto 1\r\n', '++read\r\n', '++read\r\n']   # commands that are sent to the serial bus at startup
 COMMANDS_DELAY = 1.2                            # delay between commands executed (sent) to the serial bus
+PAUSE_MODE = 'drain'                            # while paused, 'drain' reads and discards incoming data, 'hold' leaves it in the OS buffer until capture resumes
 
-# global event for pausing/resuming capture
+# global events for pausing/resuming capture, serialRun is the inverse of serialPause for waiting on a resume
 serialPause = Event()
+serialRun = Event()
+serialRun.set()
 version = '1.1'
 
+# cached terminal geometry and the dots used for animation
+terminal = {'justify': '{:<79}', 'blank': ' ' * 80}
+DOTS = '.' * 9
+
 # get the size of the dumpfile on disk
 def getSize(fileobject):
     fileobject.seek(0,2) # move the cursor to the end of the file
@@ -120,8 +131,7 @@ def clearBuffer():
 
 # console output with or without newline and dots
 def printConsole(text_string='', newLine=True, startNewLine=False, animateDots=False):
-    rows, columns = os.popen('stty size', 'r').read().split()
-    justify_string = '{:<' + str(int(columns)-1) + '}'
+    justify_string = terminal['justify']
     if startNewLine == True:
         text_string = '\r\n' + text_string
     if newLine == True:
@@ -129,23 +139,19 @@ def printConsole(text_string='', newLine=True, startNewLine=False, animateDots=F
     else:
         if animateDots == True:
             # clear the line before printing on it again
-            blank_string = ''
-            i = 0
-            while i < int(columns):
-                blank_string += ' '
-                i += 1
-            print(justify_string.format(blank_string), end='\r')
-            now = datetime.datetime.now()
-            seconds = int(now.strftime("%S")[-1:])
-            dots = '.'
-            i = 1
-            while i < seconds:
-                dots += '.'
-                i += 1
+            print(justify_string.format(terminal['blank']), end='\r')
+            seconds = datetime.datetime.now().second % 10
+            dots = DOTS[:max(seconds, 1)]
             print(justify_string.format(text_string + dots), end='\r', flush=True)
         else:
             print(justify_string.format(text_string), end='\r', flush=True)
 
+# detect terminal width in order to reserve characters for blanking, refreshed on SIGWINCH
+def updateGeometry(signum=None, frame=None):
+    columns = shutil.get_terminal_size().columns
+    terminal['justify'] = '{:<' + str(columns - 1) + '}'
+    terminal['blank'] = ' ' * columns
+
 # determine keypress
 def getCh():
     fd = sys.stdin.fileno()
@@ -170,12 +176,14 @@ def handleInput():
 
         if (char.lower() == "p"):
             printConsole("'P' received, aborting capture...", startNewLine=True)
+            serialRun.clear()
             serialPause.set()
 
         if (char.lower() == "r"):
             printConsole("'R' received, resuming serial capture...", startNewLine=True)
             clearBuffer()
             serialPause.clear()
+            serialRun.set()
 
         if (char.lower() == "i"):
             displayParams()
@@ -193,6 +201,7 @@ def handleArgs():
     parser.add_argument('-s', type=int, metavar='[baud]', help="Override serial speed", required=False)
     parser.add_argument('-f', type=str, metavar='[/tmp/raw]', help="Override buffer file", required=False)
     parser.add_argument('-o', type=str, metavar='[/tmp/tek2]', help="Override output directory", required=False)
+    parser.add_argument('-c', type=int, metavar='[bytes]', help="Override serial read chunk size", required=False)
     parser.add_argument('-v', '--version', help='Show version and exit', default=False, action='version', version=version)
     args = parser.parse_args()
 
@@ -215,12 +224,15 @@ def handleArgs():
     if args.o:
         global FILE_DIR
         FILE_DIR = args.o
+    if args.c:
+        global CAPTURE_CHUNK
+        CAPTURE_CHUNK = args.c
 
 # store serial input
 def listenSerial(serialPause):
     if not SERIAL_IGNORE == True:
         try:
-            ser = serial.Serial(SERIAL_PORT, SERIAL_RATE)
+            ser = serial.Serial(SERIAL_PORT, SERIAL_RATE, timeout=CAPTURE_TIMEOUT)
         except OSError as err:
             printConsole("Failed to open interface " + SERIAL_PORT + " with error " + str(err) + "!")
             printConsole("Unable to continue, exiting...")
@@ -228,9 +240,9 @@ def listenSerial(serialPause):
             os._exit(5)
 
         # send optional startup commands to serial interface
-        logger.printConsole("Executing any startup commands...")
+        printConsole("Executing any startup commands...")
         for command in COMMANDS_STARTUP:
-            logger.printConsole("Sending startup command " + command.replace('\r', '').replace('\n', '') + "...")
+            printConsole("Sending startup command " + command.replace('\r', '').replace('\n', '') + "...")
             ser.write(command.encode())
             time.sleep(COMMANDS_DELAY)
 
@@ -244,16 +256,34 @@ def listenSerial(serialPause):
             os._exit(5)
         while True:
             if not serialPause.is_set():
-                databyte = ser.read(1)
-                #print(databyte)
-                dumpfile.write(databyte)
-                dumpfile.flush()
+                captureChunk(ser, dumpfile)
+            elif PAUSE_MODE == 'drain':
+                # read and throw away whatever arrives so the port's buffer doesn't overflow, the
+                # read blocks for up to CAPTURE_TIMEOUT
+                ser.read(CAPTURE_CHUNK)
+            else:
+                # leave the data with the OS and sleep until capture resumes
+                serialRun.wait()
     else:
         printConsole("Skipping configured interface " + SERIAL_PORT + ". Serial input disabled.")
 
+# read whatever the port holds (or up to CAPTURE_CHUNK bytes within CAPTURE_TIMEOUT) and write
+# it to the dump file in one go instead of issuing a read, write and flush per byte
+def captureChunk(ser, dumpfile):
+    pending = ser.in_waiting
+    if pending:
+        databytes = ser.read(min(pending, CAPTURE_CHUNK))
+    else:
+        databytes = ser.read(CAPTURE_CHUNK)
+    if databytes:
+        dumpfile.write(databytes)
+        dumpfile.flush()
+    return len(databytes)
+
 # show operating parameters
 def displayParams():
     printConsole("Serial params:        " + SERIAL_PORT + " @ " + str(SERIAL_RATE) + " using a " + str(TIMEOUT_S) + "s timeout", startNewLine=True)
+    printConsole("Capture chunks:       up to " + str(CAPTURE_CHUNK) + " bytes per read (" + str(CAPTURE_TIMEOUT) + "s read timeout)")
     if KEEP_BUFFER == True:
         buffer_persistence = " with persistence"
     else:
@@ -279,6 +309,8 @@ def displayVersion():
 
 # main task launches the threads for the timer, input and serial listener
 def main():
+    updateGeometry()
+    signal.signal(signal.SIGWINCH, updateGeometry)
     displayVersion()
     time.sleep(0.5)
     # display config parameters and parse arguments
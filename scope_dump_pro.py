@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 #
-# This script opens a given serial port and waits for data. When data is received, it is dumped
-# to a file on disk byte by byte. The data in memory is flushed to disk after each byte to ensure
-# that the timer thread does not prematurely consider the print job to be complete. The delay after
-# which a job is finished can be set by adjusting TIMEOUT_S. Note that CTS/DTR and XON/XOF are not
-# handled or addressed currently. When a job is considered complete, a binary (gpcl6 from the
-# Ghostscript project is currently used) is called to convert the PCL/HPGL datafile into a human
-# readable format. While logic is in place for byte-by-byte parsing in order to detect discrete
-# beginning and endings of jobs, these do not appear to exist, or come in the shape of out-of-band
-# signalling on the serial line.
+# This script opens a given serial port and waits for data. When data is received, it is collected
+# in memory in chunks of up to CAPTURE_CHUNK bytes. A job is only moved to disk if it grows beyond
+# BUFFER_SPILL bytes, and all data is appended to the buffer file if it is to be kept (-k). Each
+# chunk is tokenized as it arrives, so a job ends as soon as a PCL reset (ESC E), a PJL Universal
+# Exit Language, the end of a raster graphic or an HP-GL IN, PG or SP0 command completes it.
+# Otherwise a job is finished once no data was received for TIMEOUT_S. Note that CTS/DTR and XON/XOF are not handled or addressed
+# currently. When a job is considered complete, a binary (gpcl6 from the Ghostscript project is
+# currently used) is called to convert the PCL/HPGL data into a human readable format. The job is
+# streamed to the converter through stdin, so it is never read back from disk.
 # PDF is the preferred conversion target, but PNG is available, too. Adjust the PCL_ARGS accordingly
 # depending on the arguments used.
 # To bypass the requirement of having a serial port, /dev/ttyACM0 or other (virtual) devices can be
@@ -30,60 +30,160 @@ import time
 import datetime
 import os
 import argparse                     # optional arguments
-from threading import Thread, Event # support for timer, input and serial threads
+from threading import Thread, Event, Lock, Condition # support for timer, input and serial threads
 import subprocess                   # launch external commands
+import shlex
+import re
+import html                         # escape SVG text
+import shutil
+import hashlib                      # render cache keys
+import sqlite3                      # trace catalog
+import urllib.parse                 # read-only catalog URI
+from concurrent.futures import ThreadPoolExecutor, Future   # render workers
+import tempfile
+import itertools                    # job IDs
+from collections import deque, OrderedDict
+import queue                        # log pipeline
+import asyncio                      # event loop capture core (-a)
 import sys, termios, tty            # keyboard input together with os and time
-
-# Pro requirements
-import tkinter as tk                # GUI elements
-from tkinter import ttk
-from tkinter import messagebox as mb
-from tkinter import scrolledtext
-from tkinter.filedialog import askopenfilename
-from PIL import Image, ImageTk      # image support
-import fitz                         # PDF support
+import signal                       # terminal resize notifications
+
+# Pro requirements, loaded on demand by loadGUI() and loadImaging() so that headless mode does
+# not pay for them
+tk = ttk = mb = scrolledtext = askopenfilename = None   # GUI elements
+Image = ImageTk = ImageDraw = ImageFont = None      # image support
+fitz = None                         # PDF support
+numpy = None                        # native phosphor, raster and plot processing
+
+# load the modules needed for image processing
+def loadImaging():
+    global Image, ImageDraw, ImageFont, numpy
+    if Image:
+        return
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+# load the modules needed for the GUI and previews
+def loadGUI():
+    global tk, ttk, mb, scrolledtext, askopenfilename, ImageTk, fitz
+    import tkinter as tk
+    from tkinter import ttk
+    from tkinter import messagebox as mb
+    from tkinter import scrolledtext
+    from tkinter.filedialog import askopenfilename
+    from PIL import ImageTk
+    import fitz
+    loadImaging()
+
+# load MuPDF, which headless mode only uses to rasterise thumbnails and can do without
+def loadPDF():
+    global fitz
+    if fitz:
+        return
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
 
 # config parameters
-SERIAL_PORT = '/dev/ttyACM1'                    # serial port to use
-SERIAL_RATE = 115200                            # BAUD rate. HP 54645D goes up to 19200, AR488 is at 115200
+SERIAL_PORT = '/dev/ttyACM1'                    # serial port to use, or a list of ports to capture from all of them
+SERIAL_RATE = 115200                            # BAUD rate. HP 54645D goes up to 19200, AR488 is at 115200. A list sets the rate per port
 SERIAL_IGNORE = False                           # bypass attaching to the serial interface
-BUFFER_FILE = '/tmp/scope.dump'                 # data buffer file on disk
+HEADLESS = False                                # run without the GUI and native previews, e.g. on machines without a display
+CAPTURE_ASYNC = False                           # capture, detect jobs and render from a single asyncio event loop instead of threads
+BUFFER_FILE = '/tmp/scope.dump'                 # data buffer file on disk, only used for persistence or -n. With several ports, the port name is added
+BUFFER_SPILL = 8388608                          # job size in bytes above which a job is moved from memory to disk
 KEEP_BUFFER = False                             # keep the buffer (disk only), can be used for debugging or batch jobs
 TIMEOUT_S = 2                                   # timeout before rendering job in seconds
+JOB_SPLIT = True                                # end jobs at PCL resets, PJL exits and HP-GL IN/PG/SP0 instead of only after TIMEOUT_S
+JOB_SPLIT_RASTER = True                         # also end jobs at the end of a raster graphic (ESC*rB/ESC*rC)
+JOB_LANGUAGE = 'auto'                           # language of the incoming jobs: 'pcl', 'hpgl' or 'auto' to detect it per job
+CAPTURE_CHUNK = 4096                            # maximum number of bytes read from the serial port at once
+CAPTURE_TIMEOUT = 0.05                          # read timeout in seconds after which a partially filled chunk is returned
 PCL_BINARY = '/usr/local/bin/gpcl6'             # binary called to convert the PCL/HPGL dump to another format
 PCL_ARGS = '-sDEVICE=pdfwrite -o '              # optional arguments for above binary - use empty string for none
+PCL_STDIN = '-'                                 # argument which makes above binary read the job from stdin - use empty string for none
+RENDER_WORKERS = 2                              # number of jobs that are rendered concurrently
+CACHE_DIR = ''                                  # render cache directory, empty for .scope_cache in FILE_DIR
+CACHE_SIZE = 268435456                          # maximum size of the render cache in bytes, 0 to disable it
+CATALOG = True                                  # record every job and its rendered files in the trace catalog
+CATALOG_FILE = ''                               # trace catalog database, empty for .scope_catalog.sqlite in FILE_DIR
+CATALOG_LIMIT = 200                             # traces listed by -q and loaded at a time by the trace browser
+QUERY = None                                    # filter given with -q, list matching traces instead of capturing
 #PCL_ARGS = '-sDEVICE=pngalpha -r128 -dGraphicsAlphaBits=4 -o '
 FILE_DIR = os.environ['HOME']                   # location to render the resulting files
 FILE_BASENAME = 'scope_output_'                 # file name prefix for rendered files
+FILE_TAG = ''                                   # instrument name added to rendered file names, e.g. 'HP54645D'. A list sets the name per port
 FILE_VIEWER = 'firefox'                         # command used to preview the rendered files
-CONV_FORMAT = 'pdf'                             # file name suffix used for rendered files
+CONV_FORMAT = 'pdf'                             # file name suffix used for rendered files, or a list of them to render each job to several formats (the first one is previewed)
+PCL_FORMAT_ARGS = {'pdf': '-sDEVICE=pdfwrite -o ', 'png': '-sDEVICE=pnggray -r150 -o '}   # arguments for PCL_BINARY per format, for the formats in CONV_FORMAT after the first one (which uses PCL_ARGS)
+THUMB_SIZE = 256                                # size in pixels of a PNG thumbnail written next to each rendered job for galleries, 0 to disable
 PNG_PHOSPHOR = True                             # use ImageMagick to convert PNG files to a phoshor look
 PNG_PHOSPHOR_CMD = '/usr/bin/convert'           # location of the ImageMagick binary for conversion
 PNG_PHOSPHOR_ARGS = "-alpha on -fill \"#00EE00\" -draw 'color 0,0 replace' +level-colors green,black -auto-level"  # arguments for phosphor conversion
+PNG_PHOSPHOR_NATIVE = True                      # use the built-in phosphor conversion (requires NumPy) instead of above command and arguments
+RASTER_NATIVE = True                            # decode jobs consisting of PCL raster graphics only (screen dumps) in process instead of using PCL_BINARY (requires NumPy)
+HPGL_NATIVE = True                              # plot HP-GL jobs in process instead of using PCL_BINARY (requires NumPy), also allows 'svg' as CONV_FORMAT
+HPGL_WIDTH = 1600                               # width in pixels of natively plotted PNG and PDF files
+HPGL_PENS = ['#000000', '#CC0000', '#008800', '#0000CC', '#CC8800', '#008888', '#880088', '#666666']   # colors of pens 1 and up
 PREVIEW = True                                  # whether to automatically preview rendered files
 OUTPUT_DATETIME = True                          # prefix output with a date and time stamp
 PREVIEW_NATIVE = True                           # enable or disable GUI automatic previews
 PREVIEW_NATIVE_W = 544                          # initial width to which to scale the image for native previewing
 PREVIEW_NATIVE_H = 704                          # initial height to which to scale the image for native previewing
+PREVIEW_SETTLE_MS = 150                         # delay after the last resize of a PDF preview before it is redrawn at full quality
 NATIVE_LOGGER = True                            # whether to show the native logger output in the GUI
+LOG_QUEUE = 1024                                # console lines that may be pending before further lines are dropped
+LOG_LINES = 5000                                # lines kept in the GUI logger, older lines are removed
+LOG_INTERVAL_MS = 100                           # interval at which pending lines are added to the GUI logger
+STATUS_INTERVAL_MS = 100                        # interval at which changes in capture status are shown in the GUI
 COMMANDS_STARTUP = ['++srqauto 1\r\n', '++read\r\n', '++read\r\n']   # commands that are sent to the serial bus at startup
 COMMANDS_DELAY = 1.2                            # delay between commands executed (sent) to the serial bus
+PAUSE_MODE = 'drain'                            # while paused, 'drain' reads and discards incoming data, 'hold' leaves it in the OS buffer until capture resumes
+LOGO_FILE = 'logo.jpg'                          # logo shown in the main window
+LOGO_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.environ['HOME'], '.cache'), 'scope_dump', 'logo.png')   # copy of the logo scaled to size, recreated when missing or older than LOGO_FILE
 
 
-# global events for pausing/resuming capture and closing trace windows
+# global events for pausing/resuming capture, serialRun is the inverse of serialPause for waiting on a resume
 serialPause = Event()
-eventCloseTraces = Event()
+serialRun = Event()
+serialRun.set()
 version = 'Pro 1.2'
 
+# capture status shared between the worker threads and the GUI, workers replace values without
+# locking and the Tk loop picks up whatever changed since it last looked
+class StatusModel:
+
+    def __init__(self, **values):
+        self.values = dict(values)
+
+    # update a status field, safe to call from any thread
+    def set(self, field, value):
+        self.values[field] = value
+
+    # set a field only if nothing was reported for it yet
+    def default(self, field, value):
+        self.values.setdefault(field, value)
+
+    # copy of the current values
+    def snapshot(self):
+        return dict(self.values)
+
 ### GUI class
-class GUI(tk.Tk):
+class GUI:
 
     def __init__(self, root):
-        self.status_serial = tk.StringVar()
-        self.status_bytes = tk.StringVar()
-        self.status_last_capture = tk.StringVar()
+        self.status = StatusModel()
+        self.status_vars = {}           # StringVars of the status labels by field
+        self.status_shown = {}          # values last pushed to the status labels
         self.text_area = ''
+        self.log_lines = deque(maxlen=LOG_LINES)    # lines waiting to be added to the GUI logger
         self.root = root
+        self.traces = []                # open trace windows
+        self.catalog = None             # trace catalog for the trace browser
 
     # display the main GUI
     def mainWindow(self, root, input):
@@ -99,6 +199,7 @@ class GUI(tk.Tk):
             self.text_area.config(background='black', foreground='#0F0')
             self.text_area.grid(column = 0, pady = 10, padx = 0)
             logger_frame.grid(row=1, column=0, columnspan=2)
+            root.after(LOG_INTERVAL_MS, self.drainLog)
 
         root.title("Scope dump " + version)  # title of the GUI window
         root.resizable(0, 0)
@@ -116,11 +217,10 @@ class GUI(tk.Tk):
         # create labels in left_frame
         tk.Label(left_frame, text="Scope dump " + version).grid(row=0, column=0, padx=5, pady=5)
 
-        # load image
-        image_logo = Image.open('logo.jpg')
-        image_logo = image_logo.resize((300,300), Image.BOX)
-        self.tkimage_logo = ImageTk.PhotoImage(image_logo) # use self to persist garbage collection
-        tk.Label(right_frame, image=self.tkimage_logo, height=310, width=300).grid(row=0,column=0, padx=5, pady=5)
+        # blank placeholder for the logo, which is loaded once the window is up
+        self.tkimage_logo = tk.PhotoImage(width=300, height=300)
+        self.label_logo = tk.Label(right_frame, image=self.tkimage_logo, height=310, width=300)
+        self.label_logo.grid(row=0,column=0, padx=5, pady=5)
 
         # tool bar frame
         tool_bar = tk.Frame(left_frame, width=100, height=400)
@@ -134,14 +234,17 @@ class GUI(tk.Tk):
         tk.Button(tool_bar, text="Quit", command=lambda: self.quitApplication(), width=10, underline=0).grid(row=3, column=1, padx=5, pady=4)
         tk.Button(tool_bar, text="Close traces", command=lambda: self.closeTraces(), width=10, underline=0).grid(row=1, column=1, padx=5, pady=4)
         tk.Button(tool_bar, text="Stop capture", command=lambda: input.serialControl(command='stop'), width=10, underline=3).grid(row=2, column=1, padx=5, pady=4)
+        tk.Button(tool_bar, text="Browse", command=lambda: self.browseTraces(), width=10, underline=0).grid(row=4, column=0, padx=5, pady=4)
 
         #status_window = tk.Label(tool_bar, text='', background='white', width=30, height=7).grid(row=6, column=0, padx=10, pady=10)
-        label_status = tk.Label(tool_bar, textvariable=str(self.status_serial), width=25, height=1, background='black', foreground='#0F0', font=("TkFixedFont", 12)).grid(row=7, column=0, padx=10, pady=8, columnspan=2)
-        tk.Label(tool_bar, textvariable=self.status_bytes, width=25, height=1, background='black', foreground='#0F0', font=("TkFixedFont", 12)).grid(row=8, column=0, padx=10, pady=8, columnspan=2)
-        tk.Label(tool_bar, textvariable=self.status_last_capture, width=25, height=1, background='black', foreground='#0F0', font=("TkFixedFont", 12)).grid(row=9, column=0, padx=10, pady=8, columnspan=2)
-        self.status_last_capture.set('No captures in session')
-        self.status_serial.set('Loading...')
-        self.status_bytes.set('Loading...')
+        # status table, the capture and data status of each serial port followed by the last capture
+        row = 7
+        for listener in input.seriallisteners:
+            self.addStatus(tool_bar, 'serial' + listener.field, 'Loading...', row)
+            self.addStatus(tool_bar, 'bytes' + listener.field, 'Loading...', row + 1)
+            row += 2
+        self.addStatus(tool_bar, 'last_capture', 'No captures in session', row)
+        self.pollStatus()
 
         # hotkeys serial control
         root.bind('p', lambda event: input.serialControl(command='stop'))
@@ -158,6 +261,9 @@ class GUI(tk.Tk):
         root.bind('o', lambda event: self.openTrace())
         root.bind('O', lambda event: self.openTrace())
         root.bind("<F11>", lambda event: self.openTrace())
+        # browse traces hotkeys
+        root.bind('b', lambda event: self.browseTraces())
+        root.bind('B', lambda event: self.browseTraces())
         # close traces hotkeys
         root.bind('c', lambda event: self.closeTraces())
         root.bind('C', lambda event: self.closeTraces())
@@ -171,6 +277,20 @@ class GUI(tk.Tk):
         root.bind('I', lambda event: input.displayParams())
 
         root.update_idletasks()
+        root.after_idle(self.loadLogo)
+
+    # show the logo from the pre-scaled copy, scaling LOGO_FILE only if that copy is missing or outdated
+    def loadLogo(self):
+        try:
+            if not os.path.exists(LOGO_CACHE) or os.stat(LOGO_CACHE).st_mtime < os.stat(LOGO_FILE).st_mtime:
+                os.makedirs(os.path.dirname(LOGO_CACHE), exist_ok=True)
+                with Image.open(LOGO_FILE) as image_logo:
+                    image_logo.resize((300,300), Image.BOX).save(partialName(LOGO_CACHE))
+                os.replace(partialName(LOGO_CACHE), LOGO_CACHE)
+            self.tkimage_logo = tk.PhotoImage(file=LOGO_CACHE) # use self to persist garbage collection
+        except (OSError, tk.TclError):
+            return
+        self.label_logo.config(image=self.tkimage_logo)
 
     # display help / about GUI dialog
     def displayAbout(self):
@@ -189,6 +309,7 @@ class GUI(tk.Tk):
             "  [F3] or [r]esume the serial polling service \n" + \
             "  [F1] or [h]help dialog (this screen) \n" + \
             " [F11] or [o]pen trace in main window \n" + \
+            "          [b]rowse traces in the catalog \n" + \
             " [F12] or [c]lose all open trace windows \n" + \
             " [F10] or [q]uit PCL dump in main window \n")
 
@@ -197,23 +318,130 @@ class GUI(tk.Tk):
         tk.Tk().withdraw()
         res = mb.askquestion('Exit Scope dump', 'Do you want to exit the program?')
         if res == 'yes' :
-            os._exit(0)
+            # shut down from a thread of its own, renders finishing meanwhile may still call on Tk
+            Thread(target=self.input.quit).start()
 
     # select a file and launch it in a new window
     def openTrace(self):
         files = self.fileDialog(mode='OPEN', path=FILE_DIR)
         if files:
             for file in files:
-                preview = Trace()
+                preview = Trace(gui=self)
                 if file.endswith('png'):
                     preview.previewImage(file)
                 elif file.endswith('pdf'):
                     preview.previewPDF(file)
 
-    # close open trace windows
+    # list the traces recorded in the catalog, newest first and a page at a time, without scanning
+    # FILE_DIR. Enter filters by port, instrument, language, hash or file name, double click opens a trace
+    # in the format chosen from those it was rendered to
+    def browseTraces(self):
+        if not self.catalog or not self.catalog.connection:
+            self.input.logger.printConsole("Trace catalog not available, use Open trace instead", startNewLine=True)
+            return
+        rows = {}           # catalog rows by tree item
+        last = []           # the last row loaded, the next page starts after it
+
+        # load the first page for the current filter, or add the next one
+        def load_page(more=False):
+            if not more:
+                tree.delete(*tree.get_children())
+                rows.clear()
+                last.clear()
+            page = self.catalog.query(search.get().split(), limit=CATALOG_LIMIT, after=last[0] if last else None)
+            for row in page:
+                job_id, captured, port, instrument, size, job_hash, language, reason, render_time, preview, thumbnail = row
+                captured = datetime.datetime.fromtimestamp(captured).strftime("%Y-%m-%d %H:%M:%S")
+                item = tree.insert('', 'end', values=(captured, ' '.join(filter(None, (instrument, port))), language or '', size,
+                    os.path.basename(preview) if preview else '(not rendered)'))
+                rows[item] = row
+            if page:
+                last[:] = page[-1:]
+            more_button.config(state=tk.NORMAL if len(page) == CATALOG_LIMIT else tk.DISABLED)
+
+        # show the thumbnail of the selected trace and offer the formats it was rendered to
+        def show_thumbnail(event):
+            selection = tree.selection()
+            thumbnail = rows[selection[0]][10] if selection else None
+            formats = [conv_format for conv_format, path in self.catalog.outputs(rows[selection[0]][0]) if conv_format != 'thumb'] if selection else []
+            format_box.config(values=formats)
+            format_choice.set(formats[0] if formats else '')
+            photo = ''
+            if thumbnail:
+                try:
+                    photo = ImageTk.PhotoImage(Image.open(thumbnail))
+                except OSError:
+                    pass
+            thumbnail_label.config(image=photo or blank)
+            thumbnail_label.image = photo   # avoid garbage collection
+
+        # preview the selected traces in the chosen format, formats without a native preview go to
+        # FILE_VIEWER
+        def open_selection(event=None):
+            for item in tree.selection():
+                preview = dict(self.catalog.outputs(rows[item][0])).get(format_choice.get()) or rows[item][9]
+                if not preview or not os.path.exists(preview):
+                    self.input.logger.printConsole("Trace " + (preview or str(rows[item][0])) + " is not available", startNewLine=True)
+                    continue
+                trace = Trace(gui=self)
+                if preview.endswith('png'):
+                    trace.previewImage(preview)
+                elif preview.endswith('pdf'):
+                    trace.previewPDF(preview)
+                else:
+                    try:
+                        subprocess.Popen(shlex.split(FILE_VIEWER) + [preview])
+                    except OSError as err:
+                        self.input.logger.printConsole("WARNING: Failed to launch viewer \"" + FILE_VIEWER + "\" with error " + str(err) + "!", startNewLine=True)
+
+        window = tk.Toplevel()
+        window.title("Traces: " + self.catalog.path)
+        window.configure(background="beige")
+        search = tk.StringVar()
+        search_entry = tk.Entry(window, textvariable=search, width=50)
+        search_entry.grid(row=0, column=0, padx=5, pady=5, sticky='we')
+        search_entry.bind('<Return>', lambda event: load_page())
+        tk.Button(window, text="Search", command=lambda: load_page(), width=10).grid(row=0, column=1, padx=5, pady=5)
+        tree = ttk.Treeview(window, columns=('captured', 'port', 'language', 'bytes', 'file'), show='headings', height=20)
+        for column, heading, width in (('captured', "Captured", 150), ('port', "Port", 120), ('language', "Language", 70), ('bytes', "Bytes", 80), ('file', "File", 330)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='e' if column == 'bytes' else 'w')
+        tree.grid(row=1, column=0, columnspan=2, padx=(5, 0), pady=5)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        scrollbar.grid(row=1, column=2, pady=5, sticky='ns')
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.bind('<<TreeviewSelect>>', show_thumbnail)
+        tree.bind('<Double-1>', open_selection)
+        tree.bind('<Return>', open_selection)
+        blank = tk.PhotoImage(width=max(THUMB_SIZE, 1), height=max(THUMB_SIZE, 1))
+        thumbnail_label = tk.Label(window, image=blank, background='black')
+        thumbnail_label.grid(row=1, column=3, padx=5, pady=5)
+        more_button = tk.Button(window, text="More", command=lambda: load_page(more=True), width=10)
+        more_button.grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        format_choice = tk.StringVar()
+        format_box = ttk.Combobox(window, textvariable=format_choice, state='readonly', width=8)
+        format_box.grid(row=2, column=0, padx=5, pady=5, sticky='e')
+        tk.Button(window, text="Open", command=open_selection, width=10).grid(row=2, column=1, padx=5, pady=5)
+        window.bind('<Escape>', lambda event: window.destroy())
+        self.registerTrace(window)
+        load_page()
+        search_entry.focus_set()
+
+    # keep track of a trace window so it can be closed along with all others
+    def registerTrace(self, window):
+        self.traces = [trace for trace in self.traces if trace.winfo_exists()]
+        self.traces.append(window)
+
+    # close open trace windows, the windows are destroyed from the Tk loop in one go
     def closeTraces(self):
-        global eventCloseTraces
-        eventCloseTraces.set()
+        self.root.after(0, self.destroyTraces)
+
+    # destroy all registered trace windows that are still open
+    def destroyTraces(self):
+        traces, self.traces = self.traces, []
+        for trace in traces:
+            if trace.winfo_exists():
+                trace.destroy()
 
     # display a file file dialog
     def fileDialog(self, mode='OPEN', path=''):
@@ -222,32 +450,1036 @@ class GUI(tk.Tk):
             selection = askopenfilename(filetypes=[("Select trace", ".png .pdf")], multiple=True, initialdir=path)
         return selection
 
-    # print output in scrolledtext
+    # add a label to the status table showing the given status field
+    def addStatus(self, frame, field, value, row):
+        self.status_vars[field] = tk.StringVar()
+        self.status.default(field, value)
+        tk.Label(frame, textvariable=self.status_vars[field], width=25, height=1, background='black', foreground='#0F0', font=("TkFixedFont", 12)).grid(row=row, column=0, padx=10, pady=8, columnspan=2)
+
+    # push changed status values to the labels and look again after STATUS_INTERVAL_MS
+    def pollStatus(self):
+        for field, value in self.status.snapshot().items():
+            if field in self.status_vars and self.status_shown.get(field) != value:
+                self.status_vars[field].set(value)
+                self.status_shown[field] = value
+        self.root.after(STATUS_INTERVAL_MS, self.pollStatus)
+
+    # queue output for the scrolledtext, safe to call from any thread
     def logLine(self, text_string):
-        self.text_area.configure(state="normal")
-        self.text_area.insert("end", "\n" + text_string.replace('\r','').replace('\n',''))
-        self.text_area.see(tk.END)
-        self.text_area.configure(state="disabled")
+        self.log_lines.append(text_string.replace('\r','').replace('\n',''))
+
+    # add pending output to the scrolledtext in one go from the Tk loop and drop the oldest lines
+    def drainLog(self):
+        lines = []
+        while self.log_lines:
+            lines.append(self.log_lines.popleft())
+        if lines:
+            self.text_area.configure(state="normal")
+            self.text_area.insert("end", "\n" + "\n".join(lines))
+            total = int(self.text_area.index('end-1c').split('.')[0])
+            if total > LOG_LINES:
+                self.text_area.delete('1.0', str(total - LOG_LINES + 1) + '.0')
+            self.text_area.see(tk.END)
+            self.text_area.configure(state="disabled")
+        self.root.after(LOG_INTERVAL_MS, self.drainLog)
+
+# incremental PCL/PJL tokenizer which finds the end of a job in the captured stream as it arrives
+class PCLTokenizer:
+
+    language = 'PCL'
+    UEL = b'-12345'                                         # value of the Universal Exit Language command
+    BLANK = bytes(range(0x21)) + b'\x7f'                    # bytes that don't print anything by themselves
+
+    def __init__(self, split_raster=True):
+        self.split_raster = split_raster
+        self.reset()
+
+    # start over, e.g. for a new job
+    def reset(self):
+        self.state = 'text'
+        self.content = False        # whether anything printable was seen since the last boundary
+        self.raster = False         # inside a raster graphic (ESC*r#A)
+        self.param = 0
+        self.group = 0
+        self.value = bytearray()
+        self.skip = 0               # remaining payload bytes of a data command (ESC*b#W and friends)
+        self.pjl_line = bytearray()
+
+    # tokenize a chunk and return a list of (offset, reason) tuples for every job that ends in it,
+    # the offset being the position just after the command that completes the job
+    def feed(self, chunk):
+        boundaries = []
+        i = 0
+        n = len(chunk)
+        while i < n:
+            # binary payload is skipped in one go
+            if self.skip:
+                step = min(self.skip, n - i)
+                self.skip -= step
+                i += step
+                continue
+            state = self.state
+            if state == 'text':
+                esc = chunk.find(b'\x1b', i)
+                end = n if esc < 0 else esc
+                if not self.content and chunk[i:end].translate(None, self.BLANK):
+                    self.content = True
+                if esc < 0:
+                    break
+                self.state = 'escape'
+                i = esc + 1
+                continue
+            byte = chunk[i]
+            i += 1
+            if state == 'escape':
+                if 0x21 <= byte <= 0x2f:
+                    # parameterized command, e.g. ESC*r1A
+                    self.param = byte
+                    self.group = 0
+                    del self.value[:]
+                    self.state = 'group'
+                else:
+                    # two character command, only ESC E (reset) is of interest
+                    self.state = 'text'
+                    if byte == 0x45:
+                        self.boundary(boundaries, i, 'reset')
+            elif state == 'group':
+                self.state = 'value'
+                if 0x60 <= byte <= 0x7e:
+                    self.group = byte
+                else:
+                    # no group character, e.g. ESC%-12345X or ESC%1B
+                    i -= 1
+            elif state == 'value':
+                if byte in b'0123456789+-.':
+                    self.value += byte.to_bytes(1, 'big')
+                elif 0x40 <= byte <= 0x5e or 0x60 <= byte <= 0x7e:
+                    # lower case parameter characters continue a combined command, upper case ends it
+                    self.state = 'value' if byte >= 0x60 else 'text'
+                    self.command(byte | 0x20, boundaries, i)
+                    del self.value[:]
+                else:
+                    # malformed, continue with plain data
+                    self.state = 'text'
+                    i -= 1
+            elif state == 'pjl':
+                i = self.feedPJL(chunk, i - 1)
+        return boundaries
+
+    # handle a complete (possibly combined) parameterized command
+    def command(self, letter, boundaries, offset):
+        try:
+            value = int(float(self.value)) if self.value else 0
+        except ValueError:
+            value = 0
+        param, group = self.param, self.group
+        # commands that carry binary data, e.g. ESC*b#W raster rows, ESC*b#V raster planes or ESC&p#X transparent print
+        if letter == 0x77 or (param == 0x2a and group == 0x62 and letter == 0x76) or (param == 0x26 and group == 0x70 and letter == 0x78):
+            if value > 0:
+                self.skip = value
+                self.content = True
+        elif param == 0x25 and group == 0 and letter == 0x78 and bytes(self.value) == self.UEL:
+            self.boundary(boundaries, offset, 'uel')
+            # anything following the UEL is PJL until the printer language is entered
+            self.state = 'pjl'
+            del self.pjl_line[:]
+        elif param == 0x2a and group == 0x72:
+            if letter == 0x61:
+                self.raster = True
+            elif letter in (0x62, 0x63) and self.raster:
+                self.raster = False
+                if self.split_raster:
+                    self.boundary(boundaries, offset, 'raster')
+
+    # skip PJL lines (@PJL ...) up to ENTER LANGUAGE, the next escape or anything that isn't PJL
+    def feedPJL(self, chunk, i):
+        n = len(chunk)
+        while i < n:
+            byte = chunk[i]
+            if byte == 0x1b:
+                self.state = 'text'
+                return i
+            if not self.pjl_line and byte > 0x20 and byte != 0x40:
+                self.state = 'text'
+                return i
+            i += 1
+            if byte == 0x0a:
+                entered = b'ENTER LANGUAGE' in self.pjl_line.upper()
+                del self.pjl_line[:]
+                if entered:
+                    self.state = 'text'
+                    return i
+            elif byte > 0x20 or self.pjl_line:
+                if len(self.pjl_line) < 256:
+                    self.pjl_line += byte.to_bytes(1, 'big')
+        return i
+
+    # a job ends here, but only if it printed anything
+    def boundary(self, boundaries, offset, reason):
+        if self.content:
+            boundaries.append((offset, reason))
+        self.content = False
+        self.raster = False
+
+    # PCL jobs are handed to the renderer as they are, there's no command stream
+    def takeCommands(self):
+        return None
+
+    # anything can be printed as PCL, even plain text
+    def recognized(self):
+        return True
+
+# incremental HP-GL lexer which turns the captured stream into commands and finds page and job
+# boundaries (IN, PG and SP0) as it arrives
+class HPGLLexer:
+
+    language = 'HP-GL'
+    LABELS = ('LB', 'BL', 'WD')                             # commands followed by text up to the label terminator
+    DRAWING = ('PD', 'LB', 'CI', 'AA', 'AR', 'EA', 'ER', 'RA', 'RR', 'EW', 'WG', 'PE', 'EP', 'FP')
+    DEVICE = b'()BEJKLORSUYZ'                               # device control commands (ESC.x) without parameters
+    MNEMONICS = frozenset((
+        'AA AC AD AF AH AP AR AS BF BL BP BR BZ CA CC CF CI CM CO CP CR CS CT CV DC DF DI DL DP DR DS DT DV EA EC EP ER ES EW ' +
+        'FI FN FP FR FS FT GC GM GP IM IN IP IR IV IW KY LA LB LM LO LT MC MG MT NP NR OA OC OD OE OF OG OH OI OK OL OO OP OS ' +
+        'OT OW PA PB PC PD PE PG PM PR PS PT PU PW QL RA RF RO RP RR RT SA SB SC SD SG SI SL SM SP SR SS ST SV TD TL TR UC UF ' +
+        'UL VS WD WG WU XT YT').split())                    # HP-GL and HP-GL/2 commands, to tell HP-GL from e.g. plain text
+
+    def __init__(self):
+        self.finished = deque()     # commands of jobs that ended at a boundary, waiting to be taken
+        self.commands = []          # commands of the current job
+        self.reset()
+
+    # start over, e.g. for a new job
+    def reset(self):
+        self.state = 'idle'
+        self.content = False        # whether anything was drawn since the last boundary
+        self.known = 0              # valid and unknown mnemonics since the last boundary
+        self.unknown = 0
+        self.pen_down = False
+        self.mnemonic = ''
+        self.start = 0              # offset of the current mnemonic in the chunk being fed, negative if it began in an earlier one
+        self.params = bytearray()
+        self.terminator = 0x03      # label terminator, changed by DT
+        self.finished.clear()
+        self.commands = []
+
+    # lex a chunk and return a list of (offset, reason) tuples for every job that ends in it. The
+    # offset is negative if the next job starts with bytes of an earlier chunk
+    def feed(self, chunk):
+        boundaries = []
+        i = 0
+        n = len(chunk)
+        while i < n:
+            byte = chunk[i]
+            i += 1
+            state = self.state
+            if state == 'idle':
+                if 0x41 <= (byte & 0xdf) <= 0x5a:
+                    self.mnemonic = chr(byte & 0xdf)
+                    self.start = i - 1
+                    self.state = 'mnemonic'
+                elif byte == 0x1b:
+                    self.state = 'escape'
+            elif state == 'mnemonic':
+                if 0x41 <= (byte & 0xdf) <= 0x5a:
+                    self.mnemonic += chr(byte & 0xdf)
+                    del self.params[:]
+                    if self.mnemonic in self.LABELS:
+                        self.state = 'label'
+                    elif self.mnemonic in ('DT', 'SM'):
+                        self.state = 'char'
+                    else:
+                        self.state = 'params'
+                else:
+                    self.state = 'idle'
+            elif state == 'params':
+                if byte == 0x3b:
+                    self.state = 'idle'
+                    self.command(boundaries, i)
+                elif 0x41 <= (byte & 0xdf) <= 0x5a or byte == 0x1b:
+                    # the next mnemonic (or escape) also ends the command
+                    self.state = 'idle'
+                    self.command(boundaries, i - 1)
+                    i -= 1
+                elif len(self.params) < 4096:
+                    self.params.append(byte)
+            elif state == 'label':
+                if byte == self.terminator:
+                    self.state = 'idle'
+                    self.command(boundaries, i)
+                else:
+                    self.params.append(byte)
+            elif state == 'char':
+                # DT and SM take a single character, a semicolon resets to the default
+                if byte != 0x3b:
+                    self.params.append(byte)
+                if self.mnemonic == 'DT':
+                    self.terminator = byte if byte != 0x3b else 0x03
+                self.state = 'idle'
+                self.command(boundaries, i)
+            elif state == 'escape':
+                self.state = 'device' if byte == 0x2e else 'idle'
+            elif state == 'device':
+                self.state = 'idle' if byte in self.DEVICE else 'device_params'
+            elif state == 'device_params':
+                if byte == 0x3a:
+                    self.state = 'idle'
+        # a mnemonic that is still in progress continues in the next chunk
+        self.start -= n
+        return boundaries
+
+    # handle a complete command, ending the job where needed
+    def command(self, boundaries, offset):
+        mnemonic = self.mnemonic
+        if mnemonic in self.LABELS or mnemonic in ('DT', 'SM'):
+            params = [self.params.decode('ascii', 'replace')]
+        else:
+            params = []
+            for value in self.params.replace(b' ', b',').split(b','):
+                try:
+                    params.append(float(value))
+                except ValueError:
+                    pass
+        # IN starts a new job, so anything drawn before it belongs to the previous one. The new job
+        # starts at the IN, which is a negative offset if part of it arrived with an earlier chunk
+        if mnemonic == 'IN':
+            self.boundary(boundaries, self.start, 'init')
+        self.commands.append((mnemonic, params))
+        if mnemonic in self.MNEMONICS:
+            self.known += 1
+        else:
+            self.unknown += 1
+        if mnemonic == 'PD':
+            self.pen_down = True
+        elif mnemonic == 'PU':
+            self.pen_down = False
+        if mnemonic in self.DRAWING or (mnemonic in ('PA', 'PR') and self.pen_down and params):
+            self.content = True
+        elif mnemonic == 'PG':
+            self.boundary(boundaries, offset, 'page')
+        elif mnemonic == 'SP' and params in ([], [0.0]):
+            self.boundary(boundaries, offset, 'pen')
+
+    # a job ends here, but only if it drew anything
+    def boundary(self, boundaries, offset, reason):
+        if self.content:
+            boundaries.append((offset, reason))
+            self.finished.append(self.commands)
+            self.commands = []
+            self.known = self.unknown = 0
+        self.content = False
+        self.pen_down = False
+
+    # the parsed commands of the job that ended first, or of the current job if none did
+    def takeCommands(self):
+        if self.finished:
+            return self.finished.popleft()
+        commands = self.commands
+        self.commands = []
+        return commands
+
+    # whether the current job looks like HP-GL, which a plain text printout only does by accident for
+    # a word or two
+    def recognized(self):
+        return self.known >= self.unknown
+
+# picks the PCL tokenizer or the HP-GL lexer for each job by looking at its first significant byte
+class AutoTokenizer:
+
+    def __init__(self, split_raster=True):
+        self.tokenizers = {'PCL': PCLTokenizer(split_raster=split_raster), 'HP-GL': HPGLLexer()}
+        self.current = None
+        self.finished = deque()     # language and commands of jobs that ended at a boundary, waiting to be taken
+
+    # start over and detect the language again
+    def reset(self):
+        for tokenizer in self.tokenizers.values():
+            tokenizer.reset()
+        self.current = None
+        self.finished.clear()
+
+    @property
+    def language(self):
+        if self.finished:
+            return self.finished[0][0]
+        return self.current.language if self.current and self.current.recognized() else None
+
+    # anything that turned out not to be HP-GL, such as plain text, is left to the converter
+    @property
+    def content(self):
+        return (self.current.content or not self.current.recognized()) if self.current else False
+
+    # PCL starts with an escape sequence, HP-GL with a mnemonic or a device control (ESC.x) command.
+    # None if there is nothing but blanks yet
+    def detect(self, data):
+        start = data.lstrip(b' \t\r\n\f\x00;')
+        if not start:
+            return None
+        if start[0] == 0x1b and start[1:2] != b'.':
+            return self.tokenizers['PCL']
+        return self.tokenizers['HP-GL']
+
+    # tokenize a chunk with the tokenizer of the current job. The language is detected again after
+    # every boundary, where the tokenizer starts over if the next job is in another language or
+    # hasn't started yet
+    def feed(self, chunk):
+        boundaries = []
+        start = 0
+        while True:
+            if not self.current:
+                self.current = self.detect(chunk[start:])
+                if not self.current:
+                    return boundaries
+            tokenizer = self.current
+            for offset, reason in tokenizer.feed(chunk[start:] if start else chunk):
+                offset += start
+                boundaries.append((offset, reason))
+                self.finished.append((tokenizer.language, tokenizer.takeCommands()))
+                # a job that began in an earlier chunk is already known to be in this language
+                if offset >= 0 and self.detect(chunk[offset:]) is not tokenizer:
+                    tokenizer.reset()
+                    self.current = None
+                    start = offset
+                    break
+            else:
+                return boundaries
+
+    # the parsed commands of the next job, if the language provides them
+    def takeCommands(self):
+        if self.finished:
+            return self.finished.popleft()[1]
+        return self.current.takeCommands() if self.current else None
+
+# decoder for PCL jobs that consist of raster graphics only, which is how the HP 54600 series and
+# similar instruments print their screen. Handles resolution (ESC*t#R), raster start and end
+# (ESC*r#A, ESC*rB/C), size (ESC*r#S/T), compression (ESC*b#M modes 0-3), rows (ESC*b#W) and
+# vertical offsets (ESC*b#Y). Anything else that would put ink on the page makes decode() return
+# None, so the job can go to PCL_BINARY instead
+class PCLRaster:
+
+    COMMAND = re.compile(rb'([+-]?[0-9]*(?:\.[0-9]*)?)([\x40-\x5e\x60-\x7e])')
+    IGNORED = {b'&l', b'&a', b'&u', b'&k', b'*p', b'*o', b'*t', b'*r', b'*b'}          # page setup, cursor positioning and raster groups
+    BLANK = b'\x00\n\r\x0c'                                                          # bytes that don't print anything
+
+    def __init__(self):
+        self.resolution = 75        # dots per inch of the raster (ESC*t#R)
+        self.width = 0              # source raster width in pixels (ESC*r#S), if given
+        self.rows = []              # decompressed rows
+        self.seed = b''             # previous row, the base for delta row compression
+        self.mode = 0               # compression mode (ESC*b#M)
+
+    # decode a job into an array of rows by pixels with 1 for every dot, or None if the job holds
+    # anything but raster graphics
+    def decode(self, data):
+        i = 0
+        n = len(data)
+        while i < n:
+            esc = data.find(b'\x1b', i)
+            end = n if esc < 0 else esc
+            text = data[i:end]
+            # PJL lines following a UEL are fine, printable text is not
+            while text.startswith(b'@PJL'):
+                line_end = text.find(b'\n')
+                text = text[line_end + 1:] if line_end >= 0 else b''
+            if text.translate(None, self.BLANK):
+                return None
+            if esc < 0 or esc + 1 >= n:
+                break
+            i = esc + 2
+            char = data[esc + 1:esc + 2]
+            if char == b'E':
+                continue
+            if char == b'%' and data.startswith(b'-12345X', i):
+                i += 7
+                continue
+            if not 0x21 <= data[esc + 1] <= 0x2f or i >= n:
+                return None
+            # jobs arrive as bytearrays, which can't be looked up in a set
+            group = bytes(data[esc + 1:esc + 3])
+            if group not in self.IGNORED:
+                return None
+            i += 1
+            # combined commands such as ESC*b2m120W, lower case letters continue them
+            while True:
+                match = self.COMMAND.match(data, i)
+                if not match:
+                    return None
+                i = match.end()
+                try:
+                    value = int(float(match.group(1))) if match.group(1) not in (b'', b'+', b'-', b'.') else 0
+                except ValueError:
+                    return None
+                letter = match.group(2).upper()
+                if group == b'*b' and letter == b'W':
+                    if not self.row(data[i:i + value]):
+                        return None
+                    i += value
+                elif not self.command(group, letter, value):
+                    return None
+                if match.group(2).isupper():
+                    break
+        return self.bitmap()
+
+    # apply a parameterized command, returns False for anything that can't be decoded here
+    def command(self, group, letter, value):
+        if group == b'*t' and letter == b'R' and value > 0:
+            self.resolution = value
+        elif group == b'*r':
+            if letter == b'A':
+                self.seed = b''
+            elif letter == b'S':
+                self.width = value
+            elif letter == b'U' and abs(value) != 1:
+                return False        # more than one color plane
+        elif group == b'*b':
+            if letter == b'M':
+                if value not in (0, 1, 2, 3):
+                    return False
+                self.mode = value
+            elif letter == b'Y':
+                self.rows.extend([b''] * max(value, 0))
+                self.seed = b''
+            elif letter == b'V':
+                return False        # plane data
+        elif letter == b'W':
+            return False            # binary data of some other command
+        return True
+
+    # decompress a row transferred with ESC*b#W, returns False if it is malformed
+    def row(self, data):
+        try:
+            if self.mode == 0:
+                row = data
+            elif self.mode == 1:
+                # run length encoding, pairs of repeat count minus one and byte
+                pairs = numpy.frombuffer(data[:len(data) // 2 * 2], dtype=numpy.uint8).reshape(-1, 2)
+                row = numpy.repeat(pairs[:, 1], pairs[:, 0].astype(numpy.intp) + 1).tobytes()
+            elif self.mode == 2:
+                row = self.unpackBits(data)
+            else:
+                row = self.deltaRow(data)
+        except IndexError:
+            return False
+        self.rows.append(row)
+        self.seed = row
+        return True
+
+    # TIFF PackBits: a control byte of 0-127 is followed by that many plus one literal bytes, 129-255
+    # repeat the next byte 257 minus control times and 128 does nothing
+    def unpackBits(self, data):
+        row = bytearray()
+        i = 0
+        n = len(data)
+        while i < n:
+            control = data[i]
+            i += 1
+            if control < 128:
+                row += data[i:i + control + 1]
+                i += control + 1
+            elif control > 128:
+                row += data[i:i + 1] * (257 - control)
+                i += 1
+        return bytes(row)
+
+    # delta row compression: replace bytes of the previous row. Each command byte holds the number of
+    # replacement bytes minus one (upper 3 bits) and the offset from the end of the last replacement
+    # (lower 5 bits, 31 means more offset bytes follow)
+    def deltaRow(self, data):
+        row = bytearray(self.seed)
+        position = 0
+        i = 0
+        n = len(data)
+        while i < n:
+            count = (data[i] >> 5) + 1
+            offset = data[i] & 0x1f
+            i += 1
+            if offset == 31:
+                while True:
+                    offset += data[i]
+                    i += 1
+                    if data[i - 1] != 255:
+                        break
+            position += offset
+            replacement = data[i:i + count]
+            i += count
+            if len(row) < position + len(replacement):
+                row += bytes(position + len(replacement) - len(row))
+            row[position:position + len(replacement)] = replacement
+            position += len(replacement)
+        return bytes(row)
+
+    # pad the rows to the same length and unpack them into one dot per element
+    def bitmap(self):
+        if not any(self.rows):
+            return None
+        row_bytes = max(max(len(row) for row in self.rows), (self.width + 7) // 8)
+        packed = numpy.frombuffer(b''.join(row.ljust(row_bytes, b'\x00') for row in self.rows), dtype=numpy.uint8)
+        bitmap = numpy.unpackbits(packed.reshape(len(self.rows), row_bytes), axis=1)
+        if self.width:
+            bitmap = bitmap[:, :self.width]
+        return bitmap
+
+# interpreter for the HP-GL commands of a job as parsed by HPGLLexer, covering what instruments use to
+# plot their screen (IN, IP, SC, SP, PU, PD, PA, PR, CI, LB and the label size commands SI/SR). Lines
+# are kept per pen as NumPy arrays of plotter units (0.025mm), so they can be drawn, written as SVG or
+# measured. Any other drawing command makes interpret() return False, so the job can go to PCL_BINARY
+class HPGLPlot:
+
+    UNITS = 1016                                    # plotter units per inch
+    P1P2 = (250.0, 596.0, 10250.0, 7796.0)          # default scaling points (HP 7475A, letter size)
+    MARGIN = 400                                    # plotter units of paper around the drawing
+    FONT = 0.73                                     # cap height of the label font relative to its size
+
+    def __init__(self):
+        self.strokes = []           # (pen, array of points) for every line drawn
+        self.labels = []            # (pen, x, y, character width, character height, text) for every line of text
+        self.stroke = []            # points of the line being drawn
+        self.pen = 1                # selected pen, 0 for none
+        self.initialize()
+
+    # IN: default settings and pen up at the origin, whatever was drawn is kept
+    def initialize(self):
+        self.endStroke()
+        self.pen_down = False
+        self.relative = False       # PR rather than PA
+        self.x = 0.0
+        self.y = 0.0
+        self.p1p2 = self.P1P2
+        self.user = None            # user unit range set with SC, None for plotter units
+        self.scale = (1.0, 1.0, 0.0, 0.0)
+        self.char_size = (0.285, 0.375)     # label character width and height, in cm (SI) or percent of P2-P1 (SR)
+        self.char_relative = False
+
+    # interpret a job, returns False if it uses anything that can't be drawn here
+    def interpret(self, commands):
+        for mnemonic, params in commands:
+            if not self.command(mnemonic, params):
+                return False
+        self.endStroke()
+        return bool(self.strokes or self.labels)
+
+    # apply a single command, returns False for unsupported drawing commands
+    def command(self, mnemonic, params):
+        if mnemonic in ('PA', 'PR'):
+            self.relative = mnemonic == 'PR'
+            self.move(params)
+        elif mnemonic == 'PD':
+            self.pen_down = True
+            self.move(params)
+        elif mnemonic == 'PU':
+            self.endStroke()
+            self.pen_down = False
+            self.move(params)
+        elif mnemonic == 'SP':
+            self.endStroke()
+            self.pen = int(params[0]) if params else 0
+        elif mnemonic == 'CI':
+            if params:
+                self.circle(params)
+        elif mnemonic == 'LB':
+            self.label(params[0])
+        elif mnemonic == 'IN':
+            self.initialize()
+        elif mnemonic == 'IP':
+            x1, y1, x2, y2 = self.p1p2
+            if len(params) >= 4:
+                self.p1p2 = tuple(params[:4])
+            elif len(params) >= 2:
+                # P2 follows P1 so the size of the frame stays the same
+                self.p1p2 = (params[0], params[1], params[0] + x2 - x1, params[1] + y2 - y1)
+            else:
+                self.p1p2 = self.P1P2
+            self.updateScale()
+        elif mnemonic == 'SC':
+            if len(params) >= 4 and params[0] != params[1] and params[2] != params[3]:
+                self.user = tuple(params[:4])
+            else:
+                self.user = None
+            self.updateScale()
+        elif mnemonic in ('SI', 'SR'):
+            self.char_relative = mnemonic == 'SR'
+            if len(params) >= 2:
+                self.char_size = tuple(params[:2])
+            else:
+                self.char_size = (0.75, 1.5) if self.char_relative else (0.285, 0.375)
+        elif mnemonic in HPGLLexer.DRAWING:
+            return False
+        return True
+
+    # factors and offsets from user units to plotter units, following P1, P2 and SC
+    def updateScale(self):
+        if self.user:
+            x1, y1, x2, y2 = self.p1p2
+            xmin, xmax, ymin, ymax = self.user
+            sx = (x2 - x1) / (xmax - xmin)
+            sy = (y2 - y1) / (ymax - ymin)
+            self.scale = (sx, sy, x1 - xmin * sx, y1 - ymin * sy)
+        else:
+            self.scale = (1.0, 1.0, 0.0, 0.0)
+
+    # move through each coordinate pair, drawing if the pen is down
+    def move(self, params):
+        sx, sy, ox, oy = self.scale
+        for i in range(0, len(params) - 1, 2):
+            if self.pen_down and not self.stroke:
+                self.stroke.append((self.x, self.y))
+            if self.relative:
+                self.x += params[i] * sx
+                self.y += params[i + 1] * sy
+            else:
+                self.x = params[i] * sx + ox
+                self.y = params[i + 1] * sy + oy
+            if self.pen_down:
+                self.stroke.append((self.x, self.y))
+
+    # store the line being drawn, if the pen put any ink on the paper
+    def endStroke(self):
+        if len(self.stroke) > 1 and self.pen > 0:
+            self.strokes.append((self.pen, numpy.array(self.stroke)))
+        self.stroke = []
+
+    # CI: a circle around the current position with the given radius and chord angle in degrees
+    def circle(self, params):
+        self.endStroke()
+        radius = params[0] * abs(self.scale[0])
+        chord = min(abs(params[1]), 180) if len(params) > 1 and params[1] else 5
+        angles = numpy.linspace(0, 2 * numpy.pi, max(int(numpy.ceil(360 / chord)), 3) + 1)
+        if self.pen > 0:
+            self.strokes.append((self.pen, numpy.column_stack((self.x + radius * numpy.cos(angles), self.y + radius * numpy.sin(angles)))))
+
+    # label character width and height in plotter units
+    def charSize(self):
+        if self.char_relative:
+            x1, y1, x2, y2 = self.p1p2
+            return abs(x2 - x1) * self.char_size[0] / 100, abs(y2 - y1) * self.char_size[1] / 100
+        return self.char_size[0] * self.UNITS / 2.54, self.char_size[1] * self.UNITS / 2.54
+
+    # LB: text from the current position, which moves along one character cell at a time. A line feed
+    # moves down a line, a carriage return back to where the label started
+    def label(self, text):
+        self.endStroke()
+        width, height = self.charSize()
+        start = self.x
+        for line_number, line in enumerate(text.split('\n')):
+            if line_number:
+                self.y -= 2 * height
+            for run_number, run in enumerate(line.split('\r')):
+                if run_number:
+                    self.x = start
+                run = ''.join(char for char in run if char >= ' ')
+                if run and self.pen > 0:
+                    self.labels.append((self.pen, self.x, self.y, width, height, run))
+                self.x += 1.5 * width * len(run)
+
+    # lower left and upper right corner of everything drawn plus a margin, in plotter units
+    def bounds(self):
+        points = [points for pen, points in self.strokes]
+        for pen, x, y, width, height, text in self.labels:
+            points.append(numpy.array([(x, y), (x + 1.5 * width * len(text), y + height)]))
+        points = numpy.concatenate(points)
+        return points.min(axis=0) - self.MARGIN, points.max(axis=0) + self.MARGIN
+
+    # color of a pen, cycling through the configured ones
+    def color(self, pen, pens):
+        return pens[(pen - 1) % len(pens)]
+
+    # draw the plot with Pillow on white paper, returns the image and its resolution in dots per inch
+    def image(self, width, pens):
+        low, high = self.bounds()
+        scale = (width - 1) / (high[0] - low[0])
+        height = int((high[1] - low[1]) * scale) + 1
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
+        line = max(1, round(width / 800))
+        for pen, points in self.strokes:
+            pixels = (points - low) * scale
+            pixels[:, 1] = height - 1 - pixels[:, 1]
+            draw.line(pixels.ravel().tolist(), fill=self.color(pen, pens), width=line, joint='curve')
+        fonts = {}
+        for pen, x, y, char_width, char_height, text in self.labels:
+            size = max(int(round(char_height * scale / self.FONT)), 6)
+            if size not in fonts:
+                try:
+                    fonts[size] = ImageFont.load_default(size=size)
+                except TypeError:
+                    # Pillow before 10.1 only has a fixed size default font
+                    fonts[size] = ImageFont.load_default()
+            font = fonts[size]
+            position = ((x - low[0]) * scale, height - 1 - (y - low[1]) * scale)
+            if isinstance(font, ImageFont.FreeTypeFont):
+                draw.text(position, text, fill=self.color(pen, pens), font=font, anchor='ls')
+            else:
+                draw.text((position[0], position[1] - font.getbbox(text)[3]), text, fill=self.color(pen, pens), font=font)
+        return image, scale * self.UNITS
+
+    # the plot as an SVG document in plotter units, keeping lines and text as vectors
+    def svg(self, pens):
+        low, high = self.bounds()
+        width, height = high - low
+        document = ['<svg xmlns="http://www.w3.org/2000/svg" width="' + '{:.1f}'.format(width / 40) + 'mm" height="' + '{:.1f}'.format(height / 40) + \
+            'mm" viewBox="0 0 ' + '{:.0f} {:.0f}'.format(width, height) + '">', '<rect width="100%" height="100%" fill="white"/>']
+        for pen, points in self.strokes:
+            coordinates = ' '.join('{:.1f},{:.1f}'.format(x - low[0], high[1] - y) for x, y in points)
+            document.append('<polyline fill="none" stroke="' + self.color(pen, pens) + '" stroke-width="12" stroke-linecap="round" stroke-linejoin="round" points="' + coordinates + '"/>')
+        for pen, x, y, char_width, char_height, text in self.labels:
+            document.append('<text x="' + '{:.1f}'.format(x - low[0]) + '" y="' + '{:.1f}'.format(high[1] - y) + '" font-family="monospace" font-size="' + \
+                '{:.1f}'.format(char_height / self.FONT) + '" fill="' + self.color(pen, pens) + '">' + html.escape(text) + '</text>')
+        document.append('</svg>')
+        return '\n'.join(document) + '\n'
+
+# a completed job, held in memory or in a spill file on disk
+class Job:
+
+    REASONS = {'timeout': 'timeout', 'reset': 'PCL reset', 'uel': 'PJL exit', 'raster': 'end of raster graphics',
+               'init': 'HP-GL IN', 'page': 'HP-GL PG', 'pen': 'HP-GL SP0'}
+
+    ids = itertools.count(1)        # job IDs, unique within the process (next() is atomic in CPython)
+
+    def __init__(self, data=None, path=None, size=0, last_byte=0.0, reason='timeout', language=None, commands=None, name='', instrument=''):
+        self.id = next(Job.ids)
+        self.data = data
+        self.path = path
+        self.size = size
+        self.last_byte = last_byte
+        self.reason = reason
+        self.language = language    # PCL or HP-GL, if known
+        self.commands = commands    # parsed command stream (HP-GL only)
+        self.name = name            # name of the serial port the job came from, when capturing from several
+        self.instrument = instrument    # FILE_TAG of the port the job came from
+        self.hash = None
+
+    # BLAKE2 hash of the job data, streamed from the spill file if needed
+    def getHash(self):
+        if not self.hash:
+            digest = hashlib.blake2b(digest_size=20)
+            if self.data is not None:
+                digest.update(self.data)
+            else:
+                with open(self.path, 'rb') as jobfile:
+                    for block in iter(lambda: jobfile.read(1048576), b''):
+                        digest.update(block)
+            self.hash = digest.hexdigest()
+        return self.hash
+
+    # remove the spill file of the job, if any
+    def release(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
 
-    # wrapper to refresh the GUI
-    def refresh(self):
-        self.root.update_idletasks()
+# captured job data, kept in memory and only written to disk when needed
+class JobBuffer:
+
+    def __init__(self, bufferfile, logger, spillsize=0, persist=False, external=False, tokenizer=None, name='', instrument=''):
+        self.bufferfile = bufferfile
+        self.name = name                # passed on to the jobs
+        self.instrument = instrument    # passed on to the jobs
+        self.tempdir = os.path.dirname(bufferfile) or '.'
+        self.logger = logger
+        self.spillsize = spillsize
+        self.persist = persist          # append all data to the buffer file (-k)
+        self.external = external        # another process writes the buffer file (-n)
+        self.tokenizer = tokenizer      # finds job boundaries in the stream, if any
+        self.jobs = deque()             # jobs completed by a boundary, waiting to be rendered
+        self.data = bytearray()
+        self.size = 0
+        self.last_byte = 0.0
+        self.spillfile = None
+        self.mirror = None
+        self.lock = Lock()
+        self.changed = Condition(self.lock)
+        self.wakers = []                # called on wake(), for those not waiting on the condition
+        if self.persist and not self.external:
+            try:
+                self.mirror = open(self.bufferfile, 'ab')
+            except OSError as err:
+                self.logger.printConsole("Failed to open buffer file " + self.bufferfile + " with error " + str(err) + "!")
+
+    # add a chunk of captured data, completing a job for every boundary found in it
+    def append(self, chunk):
+        with self.lock:
+            self.last_byte = time.monotonic()
+            if self.mirror:
+                self.mirror.write(chunk)
+            start = 0
+            if self.tokenizer:
+                for offset, reason in self.tokenizer.feed(chunk):
+                    # a command that starts the next job may have begun in an earlier chunk
+                    carried = self.unstore(-offset) if offset < 0 else b''
+                    offset = max(offset, 0)
+                    self.store(chunk[start:offset])
+                    self.jobs.append(self.finish(reason))
+                    self.store(carried)
+                    start = offset
+            self.store(chunk[start:] if start else chunk)
+            self.changed.notify_all()
+
+    # add data to the current job
+    def store(self, data):
+        if not data:
+            return
+        self.size += len(data)
+        if self.spillfile:
+            self.spillfile.write(data)
+        else:
+            self.data += data
+            if self.spillsize and self.size > self.spillsize:
+                self.spill()
+
+    # take the last count bytes off the current job and return them
+    def unstore(self, count):
+        count = min(count, self.size)
+        self.size -= count
+        if self.spillfile:
+            self.spillfile.seek(-count, os.SEEK_END)
+            data = self.spillfile.read(count)
+            self.spillfile.seek(-count, os.SEEK_END)
+            self.spillfile.truncate()
+            return data
+        data = bytes(self.data[-count:]) if count else b''
+        del self.data[len(self.data) - count:]
+        return data
+
+    # move the current job from memory to a spill file and continue on disk from here on
+    def spill(self):
+        try:
+            self.spillfile = tempfile.NamedTemporaryFile(prefix='scope_spill_', dir=self.tempdir, delete=False)
+        except OSError as err:
+            self.logger.printConsole("Failed to create spill file in " + self.tempdir + " with error " + str(err) + "!")
+            self.spillsize = 0
+            return
+        self.spillfile.write(self.data)
+        self.data = bytearray()
+        self.logger.printConsole("Job exceeds " + str(self.spillsize) + " bytes, moved buffer to disk")
+
+    # hand the current job over as a completed job and start a new one
+    def finish(self, reason):
+        job = Job(size=self.size, last_byte=self.last_byte, reason=reason, name=self.name, instrument=self.instrument)
+        if self.tokenizer:
+            job.language = self.tokenizer.language
+            job.commands = self.tokenizer.takeCommands()
+        if self.spillfile:
+            self.spillfile.close()
+            job.path = self.spillfile.name
+            self.spillfile = None
+        else:
+            job.data = self.data
+            self.data = bytearray()
+        self.size = 0
+        if self.mirror:
+            self.mirror.flush()
+        return job
+
+    # wake up anyone waiting on the buffer, e.g. when capture is paused or resumed
+    def wake(self):
+        with self.lock:
+            self.changed.notify_all()
+        for waker in self.wakers:
+            waker()
+
+    # the next job completed by a boundary, or None
+    def takeJob(self):
+        with self.lock:
+            return self.jobs.popleft() if self.jobs else None
+
+    # complete the current job once the buffer has been idle long enough, or None if there is
+    # nothing worth rendering
+    def finishIdle(self):
+        with self.lock:
+            return self.expire() if self.size else None
+
+    # complete the current job at the timeout, the lock must be held
+    def expire(self):
+        content = not self.tokenizer or self.tokenizer.content
+        job = self.finish('timeout')
+        if self.tokenizer:
+            self.tokenizer.reset()
+        if self.external:
+            open(self.bufferfile, 'w').close()
+        if content:
+            return job
+        # leftovers such as a trailing reset or PJL footer are not worth a render
+        self.logger.printConsole("Discarded " + str(job.size) + " bytes" + (" of " + job.language if job.language else "") + " without anything to render", startNewLine=True)
+        job.release()
+        return None
+
+    # wait for the next completed job. Jobs are complete when a boundary was found or when the
+    # buffer has been idle for timeout seconds. The capture thread notifies us about every chunk, so
+    # there's no need to poll. In the meantime report() is called with 'paused', 'idle' or the job
+    # size (at most once a second)
+    def waitComplete(self, timeout, pause, report):
+        reported = None
+        reported_at = 0.0
+        while True:
+            with self.changed:
+                if self.jobs:
+                    return self.jobs.popleft()
+                now = time.monotonic()
+                if pause.is_set():
+                    state, wait = 'paused', None
+                elif not self.size:
+                    state, wait = 'idle', None
+                else:
+                    idle = now - self.last_byte
+                    if idle >= timeout:
+                        job = self.expire()
+                        if job:
+                            return job
+                        continue
+                    state, wait = self.size, timeout - idle
+                    # changes in size are throttled, anything else is reported right away
+                    if isinstance(reported, int) and now - reported_at < 1:
+                        state = reported
+                if state == reported:
+                    self.changed.wait(wait)
+                    continue
+            reported, reported_at = state, now
+            report(state)
+
+    # discard the current job, returning its size
+    def clear(self):
+        with self.lock:
+            cleared = self.size
+            self.finish('cleared').release()
+            if self.tokenizer:
+                self.tokenizer.reset()
+            if cleared and self.external:
+                open(self.bufferfile, 'w').close()
+            return cleared
 
 # serial handling
 class SerialListener:
 
-    def __init__(self, port, speed, bufferfile, logger):
+    def __init__(self, port, speed, bufferfile, logger, renderqueue=None, name='', instrument=''):
         self.port = port
         self.speed = speed
         self.bufferfile = bufferfile
         self.logger = logger
+        self.renderqueue = renderqueue
+        self.name = name                # set when capturing from several ports, used to tell them apart
+        self.tag = '[' + name + '] ' if name else ''
+        self.field = ':' + name if name else ''
+        self.status = ''
+        self.gui = None
+        tokenizer = None
+        if JOB_SPLIT == True:
+            if JOB_LANGUAGE == 'pcl':
+                tokenizer = PCLTokenizer(split_raster=JOB_SPLIT_RASTER)
+            elif JOB_LANGUAGE == 'hpgl':
+                tokenizer = HPGLLexer()
+            else:
+                tokenizer = AutoTokenizer(split_raster=JOB_SPLIT_RASTER)
+        self.buffer = JobBuffer(bufferfile, logger, spillsize=BUFFER_SPILL, persist=KEEP_BUFFER, external=SERIAL_IGNORE, tokenizer=tokenizer, name=name, instrument=instrument)
         if not SERIAL_IGNORE == True:
             try:
-                self.ser = serial.Serial(self.port, self.speed)
+                self.ser = serial.Serial(self.port, self.speed, timeout=CAPTURE_TIMEOUT)
             except OSError as err:
                 self.logger.printConsole("Failed to open interface " + self.port + " with error " + str(err) + "!", logToGUI=False)
                 self.logger.printConsole("Unable to continue, exiting...", logToGUI=False)
                 self.logger.printConsole("Goodbye", logToGUI=False)
+                self.logger.flush()
                 os._exit(5)
         #self.listenSerial(self, serialPause)
 
@@ -257,117 +1489,990 @@ class SerialListener:
         if mode == 'start':
             self.clearBuffer()
             serialPause.clear()
-            self.logger.printConsole("Resume received, resuming capture...", GUIOnly=True)
+            serialRun.set()
+            self.logger.printConsole(self.tag + "Resume received, resuming capture...", GUIOnly=True)
         elif mode == 'stop':
+            serialRun.clear()
             serialPause.set()
-            self.logger.printConsole("Pause received, aborting capture...", GUIOnly=True)
+            self.logger.printConsole(self.tag + "Pause received, aborting capture...", GUIOnly=True)
+        self.buffer.wake()
 
     # send message to serial bus
     def sendMessage(self, command=''):
         if not SERIAL_IGNORE == True:
             self.ser.write(command.encode())
 
+    # send the startup commands paced by the given delay, capture is already running meanwhile
+    def sendStartup(self, commands, delay):
+        for wait in self.startupCommands(commands, delay):
+            time.sleep(wait)
+
+    # send the startup commands one by one, yielding the time to wait before each of them. Shared by
+    # the threads and the event loop (-a), which do the waiting
+    def startupCommands(self, commands, delay):
+        for command in commands:
+            yield delay
+            self.logger.printConsole(self.tag + "Sending startup command " + command.replace('\r', '').replace('\n', '') + "...")
+            self.sendMessage(command=command)
+        self.logger.printConsole(self.tag + "Startup commands sent")
+
     # store serial input
     def listenSerial(self, serialPause=Event()):
         if not SERIAL_IGNORE == True:
-            # open a file for writing
-            try:
-                dumpfile = open(self.bufferfile, "wb")
-            except OSError as err:
-                self.logger.printConsole("Failed to open buffer file " + self.bufferfile + " with error " + str(err) + "!")
-                self.logger.printConsole("Unable to continue, exiting...")
-                self.logger.printConsole("Goodbye")
-                os._exit(5)
             while True:
                 if not serialPause.is_set():
-                    databyte = self.ser.read(1)
-                    #print(databyte)
-                    dumpfile.write(databyte)
-                    dumpfile.flush()
+                    self.captureChunk()
+                elif PAUSE_MODE == 'drain':
+                    self.discardChunk()
+                else:
+                    # leave the data with the OS and sleep until capture resumes
+                    serialRun.wait()
         else:
             self.logger.printConsole("Skipping configured interface " + self.port + ". Serial input disabled.")
+            self.followFile()
+
+    # read whatever the port holds (or up to CAPTURE_CHUNK bytes within CAPTURE_TIMEOUT) and
+    # add it to the job buffer in one go instead of handling each byte separately
+    def captureChunk(self):
+        pending = self.ser.in_waiting
+        if pending:
+            databytes = self.ser.read(min(pending, CAPTURE_CHUNK))
+        else:
+            databytes = self.ser.read(CAPTURE_CHUNK)
+        if databytes:
+            self.buffer.append(databytes)
+        return len(databytes)
+
+    # while paused, read and throw away whatever arrives so the port's buffer doesn't overflow. The
+    # read blocks for up to CAPTURE_TIMEOUT, so this doesn't spin when nothing arrives
+    def discardChunk(self):
+        return len(self.ser.read(CAPTURE_CHUNK))
+
+    # without a serial port, pick up whatever another process writes to the buffer file
+    def followFile(self):
+        readfile = self.openFollowed()
+        if not readfile:
+            self.logger.printConsole("Unable to continue, exiting...")
+            self.logger.printConsole("Goodbye")
+            self.logger.flush()
+            os._exit(5)
+        while True:
+            databytes = self.readFollowed(readfile)
+            if databytes:
+                self.buffer.append(databytes)
+            else:
+                time.sleep(CAPTURE_TIMEOUT)
 
-    # get the size of the dumpfile on disk
-    def getSize(self, fileobject):
-        fileobject.seek(0,2) # move the cursor to the end of the file
-        size = fileobject.tell()
-        return size
-
-    # Timer task which monitors the file on disk
+    # open the buffer file for following it, creating it if needed. None if that failed
+    def openFollowed(self):
+        try:
+            open(self.bufferfile, 'ab').close()
+            return open(self.bufferfile, 'rb')
+        except OSError as err:
+            self.logger.printConsole("Failed to open buffer file " + self.bufferfile + " with error " + str(err) + "!")
+            return None
+
+    # read what was added to the followed buffer file, up to CAPTURE_CHUNK bytes
+    def readFollowed(self, readfile):
+        databytes = readfile.read(CAPTURE_CHUNK)
+        # start over if the buffer file was cleared
+        if not databytes and os.fstat(readfile.fileno()).st_size < readfile.tell():
+            readfile.seek(0)
+        return databytes
+
+    # Timer task which renders jobs as they complete, either at a job boundary or once the buffer
+    # has been idle for TIMEOUT_S after its last byte
     def timerRun(self, gui=''):
         self.gui = gui
         while True:
-            if not serialPause.is_set():
-                self.gui.status_serial.set('Capture input: RUNNING')
-                readfile = open(self.bufferfile, 'rb')
-                size_first_check = self.getSize(readfile)
-                if size_first_check == 0:
-                    self.logger.printConsole("Waiting for input.", newLine=False, animateDots=True)
-                    self.gui.status_bytes.set('Not receiving data')
-                time.sleep(TIMEOUT_S)
-                size_last_check = self.getSize(readfile)
-                if size_last_check != 0:
-                    # if it's the first byte, add a newline
-                    if size_first_check == 0:
-                        self.logger.printConsole("Starting job processing...", startNewLine=True)
-                    if size_last_check == size_first_check:
-                        self.logger.printConsole("Job complete, rendering...", startNewLine=True, newLine=True)
-                        readfile.close()
-                        trace = Trace()
-                        trace.renderFile(self.gui, self.logger)
-                        self.clearBuffer()
-                    else:
-                        self.logger.printConsole("Receiving data (" + str(size_last_check) + " bytes).", newLine=False, animateDots=True)
-                        self.gui.status_bytes.set('Receiving data: (' + str(size_last_check) + ' bytes)')
+            job = self.buffer.waitComplete(TIMEOUT_S, serialPause, self.reportStatus)
+            self.renderJob(job)
+
+    # hand a completed job to the render queue
+    def renderJob(self, job):
+        idle = time.monotonic() - job.last_byte
+        self.logger.printConsole(self.tag + "Job " + str(job.id) + " complete (" + str(job.size) + " bytes" + (" of " + job.language if job.language else "") + ", " + Job.REASONS[job.reason] + ", " + '{:.3f}'.format(idle) + "s after the last byte), rendering...", startNewLine=True, newLine=True)
+        trace = Trace(gui=self.gui)
+        return trace.renderFile(self.gui, self.logger, job, self.renderqueue)
+
+    # reflect the state of the job buffer in the console and GUI
+    def reportStatus(self, state):
+        input_name = self.name or 'Capture'
+        if state == 'paused':
+            self.logger.printConsole(self.tag + "Capture paused, idle.", newLine=False, animateDots=True)
+            serial_status, bytes_status = input_name + ' input: STOPPED', None
+        elif state == 'idle':
+            self.logger.printConsole(self.tag + "Waiting for input.", newLine=False, animateDots=True)
+            serial_status, bytes_status = input_name + ' input: RUNNING', 'Not receiving data'
+        else:
+            # if it's the first chunk, add a newline
+            if self.status == 'idle':
+                self.logger.printConsole(self.tag + "Starting job processing...", startNewLine=True)
+            self.logger.printConsole(self.tag + "Receiving data (" + str(state) + " bytes).", newLine=False, animateDots=True)
+            serial_status, bytes_status = input_name + ' input: RUNNING', 'Receiving data: (' + str(state) + ' bytes)'
+        if self.gui:
+            self.gui.status.set('serial' + self.field, serial_status)
+            if bytes_status:
+                self.gui.status.set('bytes' + self.field, bytes_status)
+        self.status = state
+
+    # clear the job buffer
+    def clearBuffer(self):
+        if self.buffer.clear() and not KEEP_BUFFER == True:
+            self.logger.printConsole("Cleared buffer")
+
+
+# event loop based capture core (-a). All ports are read through loop.add_reader as data arrives,
+# each job buffer has a call_later handle for the idle timeout and renders are awaited subprocesses,
+# so a single thread serves every port and render without polling. Native rendering and other work that
+# would hold up the loop is handed to the render workers
+class AsyncCapture:
+
+    def __init__(self, listeners, logger, renderqueue, gui=None):
+        self.listeners = listeners
+        self.logger = logger
+        self.renderqueue = renderqueue
+        self.gui = gui
+        self.timers = {}                # idle timeout handle per listener
+        self.reported = {}              # last reported state and when, per listener
+        self.tasks = set()              # startup command senders
+        self.loop = asyncio.new_event_loop()
+        self.stopped = asyncio.Event()
+        self.done = Event()             # set once the loop has shut down
+
+    # run the event loop until stop() is called, e.g. in a thread of its own
+    def serve(self):
+        try:
+            self.loop.run_until_complete(self.run())
+        finally:
+            self.loop.close()
+            self.done.set()
+
+    # capture until stopped, then shut down cleanly
+    async def run(self):
+        for listener in self.listeners:
+            listener.gui = self.gui
+            # pause and resume arrive from the keyboard thread or the GUI
+            listener.buffer.wakers.append(lambda: self.loop.call_soon_threadsafe(self.updateReaders))
+            if SERIAL_IGNORE == True:
+                self.logger.printConsole("Skipping configured interface " + listener.port + ". Serial input disabled.")
+                self.followFile(listener, None)
             else:
-                time.sleep(0.2) # without a delay in an empty loop the output tends to interfere with the next line
-                self.gui.status_serial.set('Capture input: STOPPED')
-                self.logger.printConsole("Capture paused, idle.", newLine=False, animateDots=True)
+                listener.ser.timeout = 0
+                if COMMANDS_STARTUP:
+                    task = self.loop.create_task(self.sendStartup(listener, COMMANDS_STARTUP, COMMANDS_DELAY))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+        self.updateReaders()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.shutdown()
+
+    # stop capturing, safe to call from any thread
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    # remove readers and timers, cancel pending work and close the ports
+    async def shutdown(self):
+        self.logger.printConsole("Stopping capture...", startNewLine=True)
+        for listener in self.listeners:
+            self.cancelTimer(listener)
+            if not SERIAL_IGNORE == True:
+                self.loop.remove_reader(listener.ser.fileno())
+        pending = list(self.tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await self.renderqueue.stop()
+        for listener in self.listeners:
+            if not SERIAL_IGNORE == True:
+                listener.ser.close()
+            listener.buffer.clear()
+
+    # follow the pause state: ports are only watched while capture runs
+    def updateReaders(self):
+        for listener in self.listeners:
+            if serialPause.is_set():
+                self.cancelTimer(listener)
+                # in 'hold' mode the data stays in the OS buffer until the port is watched again
+                if not SERIAL_IGNORE == True and PAUSE_MODE == 'hold':
+                    self.loop.remove_reader(listener.ser.fileno())
+                self.report(listener, 'paused')
+            else:
+                if not SERIAL_IGNORE == True:
+                    self.loop.add_reader(listener.ser.fileno(), self.readable, listener)
+                self.report(listener, listener.buffer.size or 'idle')
 
-    # clear the dump file on disk
-    def clearBuffer(self):
-        if KEEP_BUFFER == True:
+    # data arrived on a port, read what is there without blocking
+    def readable(self, listener):
+        try:
+            databytes = listener.ser.read(CAPTURE_CHUNK)
+        except serial.SerialException as err:
+            self.logger.printConsole(listener.tag + "Failed to read from " + listener.port + " with error " + str(err) + ", stopping...", startNewLine=True)
+            self.stopped.set()
+            return
+        # paused in 'drain' mode, the data is discarded
+        if not serialPause.is_set():
+            self.received(listener, databytes)
+
+    # add data to the job buffer, render any job completed by a boundary and restart the idle timer
+    def received(self, listener, databytes):
+        if not databytes:
+            return
+        listener.buffer.append(databytes)
+        job = listener.buffer.takeJob()
+        while job:
+            listener.renderJob(job)
+            job = listener.buffer.takeJob()
+        self.cancelTimer(listener)
+        if listener.buffer.size:
+            self.timers[listener] = self.loop.call_later(TIMEOUT_S, self.idle, listener)
+        self.report(listener, listener.buffer.size or 'idle')
+
+    # nothing arrived for TIMEOUT_S, the current job is complete
+    def idle(self, listener):
+        self.timers.pop(listener, None)
+        job = listener.buffer.finishIdle()
+        if job:
+            listener.renderJob(job)
+        self.report(listener, 'idle')
+
+    # drop the idle timer of a listener, if running
+    def cancelTimer(self, listener):
+        timer = self.timers.pop(listener, None)
+        if timer:
+            timer.cancel()
+
+    # pass state changes on right away and job sizes at most once a second
+    def report(self, listener, state):
+        reported, reported_at = self.reported.get(listener, (None, 0.0))
+        now = time.monotonic()
+        if state == reported or (isinstance(state, int) and isinstance(reported, int) and now - reported_at < 1):
+            return
+        self.reported[listener] = (state, now)
+        listener.reportStatus(state)
+
+    # send the startup commands paced by the given delay
+    async def sendStartup(self, listener, commands, delay):
+        for wait in listener.startupCommands(commands, delay):
+            await asyncio.sleep(wait)
+
+    # without a serial port, pick up whatever another process writes to the buffer file
+    def followFile(self, listener, readfile):
+        if not readfile:
+            readfile = listener.openFollowed()
+            if not readfile:
+                self.stopped.set()
+                return
+        databytes = b''
+        if not serialPause.is_set():
+            databytes = listener.readFollowed(readfile)
+            self.received(listener, databytes)
+        self.loop.call_later(0 if databytes else CAPTURE_TIMEOUT, self.followFile, listener, readfile)
+
+# content addressed cache of rendered files, so printing the same (frozen) screen again doesn't
+# render it again. Entries are evicted least recently used first once the cache exceeds maxsize
+class RenderCache:
+
+    def __init__(self, directory, maxsize, logger):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.logger = logger
+        self.entries = OrderedDict()    # file name -> size, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # pick up the entries of earlier sessions in the order they were last used
+            for entry in sorted((entry for entry in os.scandir(self.directory) if not entry.name.startswith('.')), key=lambda entry: entry.stat().st_atime):
+                self.entries[entry.name] = entry.stat().st_size
+                self.size += entry.stat().st_size
+        except OSError as err:
+            self.logger.printConsole("WARNING: Failed to open render cache " + self.directory + " with error " + str(err) + "!")
+            self.maxsize = 0
+
+    # cache key for a job in one format, covering everything that affects the rendered file
+    def key(self, job, conv_format):
+        phosphor = PNG_PHOSPHOR_ARGS if conv_format in ('png', 'thumb') and PNG_PHOSPHOR == True else ''
+        native = str(RASTER_NATIVE) + ' ' + str(HPGL_NATIVE) + ' ' + str(HPGL_WIDTH) + ' ' + ','.join(HPGL_PENS)
+        thumb = str(THUMB_SIZE) + ' ' + str(thumbSource()) if conv_format == 'thumb' else ''
+        params = hashlib.blake2b('\n'.join((PCL_BINARY, formatArgs(conv_format), phosphor, native, thumb)).encode(), digest_size=8).hexdigest()
+        return job.getHash() + '_' + params + ('_thumb.png' if conv_format == 'thumb' else '.' + conv_format)
+
+    # link or copy a cached render to file_name, returns False on a miss
+    def fetch(self, key, file_name):
+        if not self.maxsize:
+            return False
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False
+            self.entries.move_to_end(key)
+            path = os.path.join(self.directory, key)
+            try:
+                # only the access time records use, the rendered file may be linked to the output
+                os.utime(path, (time.time(), os.stat(path).st_mtime))
+                self.place(path, file_name)
+            except OSError:
+                # the entry disappeared from disk, render it again
+                self.size -= self.entries.pop(key)
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+
+    # add a rendered file to the cache and evict the least recently used entries if it's full
+    def store(self, key, file_name):
+        if not self.maxsize:
+            return
+        with self.lock:
+            path = os.path.join(self.directory, key)
+            try:
+                self.place(file_name, path)
+            except OSError as err:
+                self.logger.printConsole("WARNING: Failed to store " + file_name + " in the render cache with error " + str(err) + "!")
+                return
+            self.size -= self.entries.pop(key, 0)
+            self.entries[key] = os.path.getsize(path)
+            self.size += self.entries[key]
+            while self.size > self.maxsize and len(self.entries) > 1:
+                evicted, size = self.entries.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(os.path.join(self.directory, evicted))
+                except OSError:
+                    pass
+
+    # hardlink where possible, copy otherwise (e.g. across file systems), under a partial name first
+    def place(self, source, destination):
+        partial = partialName(destination)
+        try:
+            os.link(source, partial)
+        except OSError:
+            shutil.copy2(source, partial)
+        os.replace(partial, destination)
+
+    # cache statistics for the parameter overview
+    def describe(self):
+        with self.lock:
+            return str(len(self.entries)) + " entries, " + str(round(self.size / 1048576, 1)) + " of " + str(round(self.maxsize / 1048576, 1)) + " MB, " + str(self.hits) + " hits, " + str(self.misses) + " misses"
+
+# SQLite index of every completed job and the files rendered from it, so that traces can be found
+# without scanning FILE_DIR. Written by the render workers (or the event loop), read by the GUI and -q
+class TraceCatalog:
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, captured REAL NOT NULL, port TEXT NOT NULL, instrument TEXT NOT NULL, " +
+                  "bytes INTEGER NOT NULL, hash TEXT, language TEXT, reason TEXT, render_time REAL, preview TEXT, thumbnail TEXT)",
+              "CREATE TABLE IF NOT EXISTS outputs (job INTEGER NOT NULL REFERENCES jobs (id), format TEXT NOT NULL, path TEXT NOT NULL, PRIMARY KEY (job, format))",
+              "CREATE INDEX IF NOT EXISTS jobs_captured ON jobs (captured)",
+              "CREATE INDEX IF NOT EXISTS jobs_hash ON jobs (hash)")
+    COLUMNS = "id, captured, port, instrument, bytes, hash, language, reason, render_time, preview, thumbnail"
+    HASH = re.compile(r'#[0-9a-fA-F]{1,40}$|(?=[0-9]*[a-fA-F])[0-9a-fA-F]{8,40}$')    # hash prefixes, digits only (dates, sizes) need the #
+
+    # open the catalog at path, read only if readonly is set: nothing is created then and a missing
+    # catalog leaves connection at None
+    def __init__(self, path, logger=None, readonly=False):
+        self.path = path
+        self.logger = logger
+        self.lock = Lock()
+        self.connection = None
+        if readonly == True:
+            try:
+                self.connection = sqlite3.connect('file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro', uri=True, check_same_thread=False)
+            except sqlite3.Error:
+                pass
             return
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            connection = sqlite3.connect(path, check_same_thread=False)
+            # with write-ahead logging, readers such as -q in another process don't block capture
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+            self.connection = connection
+        except (OSError, sqlite3.Error) as err:
+            self.warn("WARNING: Failed to open trace catalog " + path + " with error " + str(err) + "!")
+
+    # report a problem with the catalog, which never stops capture
+    def warn(self, text_string):
+        if self.logger:
+            self.logger.printConsole(text_string)
         else:
-            bufferfile = open(self.bufferfile, 'rb')
-            if self.getSize(bufferfile):
-                bufferfile.close()
-                open(self.bufferfile, 'w').close()
-                self.logger.printConsole("Cleared buffer on disk")
+            print(text_string, file=sys.stderr)
+
+    # record a completed job with the files rendered from it, returns its ID in the catalog
+    def record(self, job, captured, port, render_time, files):
+        if not self.connection:
+            return None
+        outputs = [(conv_format, file_name) for conv_format, file_name in files.items() if os.path.exists(file_name)]
+        preview = next((file_name for conv_format, file_name in outputs if conv_format != 'thumb'), None)
+        thumbnail = next((file_name for conv_format, file_name in outputs if conv_format == 'thumb'), None)
+        with self.lock:
+            try:
+                with self.connection:
+                    cursor = self.connection.execute("INSERT INTO jobs (captured, port, instrument, bytes, hash, language, reason, render_time, preview, thumbnail) " +
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (captured, port, job.instrument, job.size, job.hash, job.language, job.reason, render_time, preview, thumbnail))
+                    self.connection.executemany("INSERT INTO outputs (job, format, path) VALUES (?, ?, ?)",
+                        [(cursor.lastrowid, conv_format, file_name) for conv_format, file_name in outputs])
+            except sqlite3.Error as err:
+                self.warn("WARNING: Failed to record job in trace catalog " + self.path + " with error " + str(err) + "!")
+                return None
+        return cursor.lastrowid
+
+    # the most recent jobs whose port, instrument, language or file name contain every word of the
+    # filter, newest first. Words of 8 or more hex digits including a letter, or any hex digits after a #,
+    # are looked up as hash prefixes using the index. Pass the last row of a page as after to get the next one
+    def query(self, words=(), limit=200, after=None):
+        if not self.connection:
+            return []
+        conditions = []
+        params = []
+        for word in words:
+            if self.HASH.match(word):
+                prefix = word.lstrip('#').lower()
+                conditions.append("hash >= ? AND hash < ?")
+                params += [prefix, prefix + 'g']
+            else:
+                conditions.append("(port LIKE ? OR instrument LIKE ? OR language LIKE ? OR preview LIKE ?)")
+                params += ['%' + word + '%'] * 4
+        if after:
+            conditions.append("(captured, id) < (?, ?)")
+            params += [after[1], after[0]]
+        sql = "SELECT " + self.COLUMNS + " FROM jobs" + (" WHERE " + " AND ".join(conditions) if conditions else "") + " ORDER BY captured DESC, id DESC LIMIT ?"
+        with self.lock:
+            try:
+                return self.connection.execute(sql, params + [limit]).fetchall()
+            except sqlite3.Error as err:
+                self.warn("WARNING: Failed to query trace catalog " + self.path + " with error " + str(err) + "!")
+                return []
+
+    # the files rendered from a job as (format, path) tuples
+    def outputs(self, job_id):
+        if not self.connection:
+            return []
+        with self.lock:
+            return self.connection.execute("SELECT format, path FROM outputs WHERE job = ? ORDER BY rowid", (job_id,)).fetchall()
+
+    # catalog statistics for the parameter overview
+    def describe(self):
+        if not self.connection:
+            return "unavailable"
+        with self.lock:
+            count = self.connection.execute("SELECT count(*) FROM jobs").fetchone()[0]
+        return self.path + " (" + str(count) + " traces)"
+
+# bounded pool of render workers, each running one converter process at a time. Jobs are submitted
+# as argument vectors and run without a shell, so capture carries on while earlier jobs render
+class RenderQueue:
+
+    def __init__(self, workers, logger, cache=None, catalog=None):
+        self.workers = workers
+        self.logger = logger
+        self.cache = cache
+        self.catalog = catalog
+        self.executor = self.createExecutor()
+        self.lock = Lock()
+        self.depth = 0              # converter runs and other work for the workers (call()) that isn't done yet
+        self.rendered = 0
+        self.render_time = 0.0
+        self.stopping = False       # set when quitting, no converter runs are started after that
+
+    # the worker threads running the converters and native renders
+    def createExecutor(self):
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+
+    # run a function in a worker, such as decoding and writing a job natively, the future resolves
+    # to what it returns
+    def call(self, function, *args):
+        with self.lock:
+            if self.stopping:
+                return self.cancelled()
+            self.depth += 1
+            future = self.executor.submit(function, *args)
+        future.add_done_callback(self.called)
+        return future
+
+    # a function run in a worker returned or was dropped, it is no longer queued
+    def called(self, future):
+        with self.lock:
+            self.depth -= 1
+
+    # continue with a function from a done callback, which already runs in a worker here
+    def follow(self, function, *args):
+        function(*args)
+
+    # queue a converter run which reads the job from stdin, followed by finish(render_time) in the same
+    # worker to post-process the file. The future resolves to the render time in seconds
+    def submit(self, argv, job, finish=None):
+        with self.lock:
+            if self.stopping:
+                return self.cancelled()
+            self.depth += 1
+            future = self.executor.submit(self.run, argv, job, finish)
+        future.add_done_callback(self.dropped)
+        return future
+
+    # a converter run cancelled before it started is no longer queued
+    def dropped(self, future):
+        if future.cancelled():
+            with self.lock:
+                self.depth -= 1
+
+    # a future for work that is refused because the queue is stopping, its callbacks clean up
+    def cancelled(self):
+        future = Future()
+        future.cancel()
+        return future
+
+    # stop rendering before quitting: queued work is dropped and whatever runs already is waited for,
+    # so no converter or partial file is left behind
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    # run the converter in a worker, streaming the job from memory or its spill file
+    def run(self, argv, job, finish=None):
+        start = time.monotonic()
+        try:
+            if job.data is not None:
+                subprocess.run(argv, input=job.data, check=True, capture_output=True)
+            else:
+                with open(job.path, 'rb') as jobfile:
+                    subprocess.run(argv, stdin=jobfile, check=True, capture_output=True)
+        finally:
+            render_time = time.monotonic() - start
+            with self.lock:
+                self.depth -= 1
+                self.rendered += 1
+                self.render_time += render_time
+        if finish:
+            finish(render_time)
+        return render_time
+
+    # queue statistics for the parameter overview
+    def describe(self):
+        with self.lock:
+            average = self.render_time / self.rendered if self.rendered else 0
+            return str(self.workers) + " workers, " + str(self.depth) + " in queue, " + str(self.rendered) + " rendered (" + '{:.3f}'.format(average) + "s average)"
+
+# render queue for the asyncio core (-a), the converter runs as a subprocess awaited on the event
+# loop with at most the given number of renders at a time, anything else that takes time runs in the
+# worker threads. submit() and call() must be called from the loop
+class AsyncRenderQueue(RenderQueue):
+
+    def __init__(self, workers, logger, cache=None, catalog=None):
+        super().__init__(workers, logger, cache=cache, catalog=catalog)
+        self.slots = asyncio.Semaphore(workers)
+        self.tasks = set()          # renders waiting or running
+        self.started = set()        # renders that got to run, the others are dropped when cancelled
+        self.calls = set()          # functions running in the worker threads
+
+    # run a function in a worker thread, such as decoding and writing a job natively, so the event
+    # loop never waits for it. The future resolves to what it returns
+    def call(self, function, *args):
+        with self.lock:
+            self.depth += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        self.calls.add(future)
+        future.add_done_callback(self.calls.discard)
+        future.add_done_callback(self.called)
+        return future
+
+    # continue with a function from a done callback, which runs on the loop, so it goes to a worker
+    def follow(self, function, *args):
+        self.call(function, *args)
+
+    # schedule a converter run followed by finish(render_time) in a worker thread to post-process the
+    # file, the task resolves to the render time in seconds
+    def submit(self, argv, job, finish=None):
+        if self.stopping:
+            return self.cancelled()
+        with self.lock:
+            self.depth += 1
+        task = asyncio.get_running_loop().create_task(self.run(argv, job, finish))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        task.add_done_callback(self.dropped)
+        return task
+
+    # a converter run cancelled before it started is no longer queued
+    def dropped(self, task):
+        if task in self.started:
+            self.started.discard(task)
+        else:
+            with self.lock:
+                self.depth -= 1
+
+    # run the converter once a slot is free, streaming the job from memory or its spill file
+    async def run(self, argv, job, finish=None):
+        self.started.add(asyncio.current_task())
+        try:
+            async with self.slots:
+                start = time.monotonic()
+                jobfile = open(job.path, 'rb') if job.data is None else None
+                try:
+                    process = await asyncio.create_subprocess_exec(*argv, stdin=jobfile or asyncio.subprocess.PIPE,
+                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                    try:
+                        stdout, stderr = await process.communicate(job.data)
+                    except asyncio.CancelledError:
+                        # don't leave the converter running when shutting down
+                        process.kill()
+                        await process.wait()
+                        raise
+                finally:
+                    if jobfile:
+                        jobfile.close()
+                if process.returncode:
+                    raise subprocess.CalledProcessError(process.returncode, argv, stdout, stderr)
+                render_time = time.monotonic() - start
+                with self.lock:
+                    self.rendered += 1
+                    self.render_time += render_time
+        finally:
+            with self.lock:
+                self.depth -= 1
+        if finish:
+            # post-processing such as the phosphor look or ImageMagick would hold up the loop. Once it
+            # started, it can't be interrupted, so a shutdown waits for it to finish the file
+            post = asyncio.get_running_loop().run_in_executor(self.executor, finish, render_time)
+            try:
+                await asyncio.shield(post)
+            except asyncio.CancelledError:
+                await post
+                raise
+        return render_time
+
+    # a future for a converter run that is refused because the queue is stopping
+    def cancelled(self):
+        future = asyncio.get_running_loop().create_future()
+        future.cancel()
+        return future
+
+    # cancel the converter runs, killing running converters, and wait for the worker threads to
+    # finish what they are writing
+    async def stop(self):
+        self.stopping = True
+        for task in list(self.tasks):
+            task.cancel()
+        while self.tasks or self.calls:
+            await asyncio.gather(*self.tasks, *self.calls, return_exceptions=True)
+            # let the done callbacks hand on whatever follows
+            await asyncio.sleep(0)
+        self.executor.shutdown()
 
 # traces
 class Trace():
 
-    # render the file as a PDF or PNG
-    def renderFile(self, gui, logger):
+    def __init__(self, gui=None):
+        self.gui = gui
+
+    # render the job to every format in CONV_FORMAT and a thumbnail, natively from one decoded image
+    # or by queueing a converter run per format. Everything that takes time happens in a render worker,
+    # so the thread that detects jobs carries on right away. Returns the future of that first step,
+    # which is done once the job was rendered natively or its converter runs were queued
+    def renderFile(self, gui, logger, job, queue):
         self.gui = gui
         self.logger = logger
         now = datetime.datetime.now()
-        file_name = FILE_DIR + '/' + FILE_BASENAME + now.strftime("%Y-%m-%d_%H:%M:%S") + '.' + CONV_FORMAT
-        render_command = PCL_BINARY + ' ' + PCL_ARGS + ' ' + file_name + ' ' + BUFFER_FILE
+        self.start = time.monotonic()
+        self.captured = now.timestamp()
+        # the job ID keeps names unique when several jobs complete within the same millisecond
+        base_name = FILE_DIR + '/' + FILE_BASENAME + (job.instrument + '_' if job.instrument else '') + (job.name + '_' if job.name else '') + \
+            now.strftime("%Y-%m-%d_%H:%M:%S.") + '{:03d}'.format(now.microsecond // 1000) + '_' + '{:04d}'.format(job.id)
+        formats = convFormats()
+        if THUMB_SIZE:
+            formats.append('thumb')
+        self.files = {conv_format: base_name + ('_thumb.png' if conv_format == 'thumb' else '.' + conv_format) for conv_format in formats}
+        self.preview = self.files[formats[0]]
         # update GUI to reflect last capture moment
-        self.gui.status_last_capture.set(str(now.strftime("%Y-%m-%d %H:%M:%S")))
+        if self.gui:
+            self.gui.status.set('last_capture', str(now.strftime("%Y-%m-%d %H:%M:%S")))
+        keys = {}
+        future = queue.call(self.prepare, job, queue, keys)
+        future.add_done_callback(lambda future: self.prepared(future, job, queue, keys))
+        return [future]
+
+    # runs in a render worker: reuse what the render cache holds and render the rest natively where
+    # possible. Returns the formats left for the converter
+    def prepare(self, job, queue, keys):
+        if queue.catalog:
+            # hash the job while it's still around, the catalog records it once rendering is done
+            job.getHash()
+        missing = []
+        for conv_format in self.files:
+            if queue.cache:
+                keys[conv_format] = queue.cache.key(job, conv_format)
+                if queue.cache.fetch(keys[conv_format], self.files[conv_format]):
+                    self.logger.printConsole("Job was rendered before, reusing " + keys[conv_format] + " from the render cache")
+                    continue
+            missing.append(conv_format)
+        if not missing:
+            self.finishJob(job, queue)
+            return []
+        if RASTER_NATIVE == True and job.language != 'HP-GL' and self.renderRaster(job, missing, queue, keys):
+            return []
+        if HPGL_NATIVE == True and job.language == 'HP-GL' and self.renderPlot(job, missing, queue, keys):
+            return []
+        # the thumbnail is scaled down from the PNG or PDF the job is rendered to anyway, only
+        # otherwise it takes a converter run of its own
+        self.thumb_source = thumbSource() if 'thumb' in missing else None
+        if self.thumb_source and self.thumb_source not in missing:
+            # the source came from the render cache
+            self.thumbnail(self.files[self.thumb_source], self.files['thumb'], queue, keys, phosphor=self.thumb_source == 'pdf')
+        runs = [conv_format for conv_format in missing if not (conv_format == 'thumb' and self.thumb_source)]
+        if not runs:
+            self.finishJob(job, queue)
+        return runs
+
+    # queue the converter runs that are left once the job is prepared
+    def prepared(self, future, job, queue, keys):
+        if future.cancelled():
+            job.release()
+            return
+        try:
+            runs = future.result()
+        except Exception as err:
+            # anything unexpected would otherwise vanish with the future
+            self.logger.printConsole("ERROR: Failed to render job " + str(job.id) + " with error " + repr(err) + "!", startNewLine=True)
+            job.release()
+            return
+        if runs:
+            self.queueRenders(job, runs, queue, keys)
+
+    # queue a converter run for each format in runs
+    def queueRenders(self, job, runs, queue, keys):
+        self.lock = Lock()
+        self.pending = len(runs)
+        for conv_format in runs:
+            render_command = [PCL_BINARY] + shlex.split(formatArgs(conv_format)) + [partialName(self.files[conv_format])] + shlex.split(PCL_STDIN)
+            future = queue.submit(render_command, job, lambda render_time, conv_format=conv_format: self.postRender(job, conv_format, queue, keys, render_time))
+            future.add_done_callback(lambda future, conv_format=conv_format: self.finishRender(future, job, conv_format, queue))
+        self.logger.printConsole("Queued job for rendering to " + ", ".join(runs).upper() + " (" + str(queue.depth) + " in queue)")
+
+    # runs in the render worker after the converter: post-process, move into place and cache a file
+    def postRender(self, job, conv_format, queue, keys, render_time):
+        file_name = self.files[conv_format]
+        partial = partialName(file_name)
+        if conv_format == 'png' and PNG_PHOSPHOR == True:
+            self.phosphorFile(partial)
+        if conv_format == 'thumb':
+            self.thumbnail(partial, file_name, queue, keys, phosphor=True)
+        elif self.complete(partial, file_name):
+            self.logger.printConsole("Rendered " + file_name + " in " + '{:.3f}'.format(render_time) + "s (" + str(queue.depth) + " in queue)")
+            if keys.get(conv_format):
+                queue.cache.store(keys[conv_format], file_name)
+            if conv_format == self.thumb_source:
+                self.thumbnail(file_name, self.files['thumb'], queue, keys, phosphor=conv_format == 'pdf')
+
+    # clean up after a failed or cancelled render, the job is recorded and previewed in a worker once
+    # all its formats are done
+    def finishRender(self, future, job, conv_format, queue):
+        if not future.cancelled():
+            try:
+                future.result()
+            except (subprocess.CalledProcessError, OSError) as err:
+                self.logger.printConsole("ERROR: Failed to decode data using \"" + PCL_BINARY + "\" with error " + str(err) + "!", startNewLine=True)
+            except Exception as err:
+                self.logger.printConsole("ERROR: Failed to process \"" + self.files[conv_format] + "\" with error " + repr(err) + "!", startNewLine=True)
+        self.discard(partialName(self.files[conv_format]))
+        with self.lock:
+            self.pending -= 1
+            if self.pending:
+                return
+        queue.follow(self.finishJob, job, queue, not future.cancelled())
+
+    # done with the job once all formats are rendered: release it, record it in the trace catalog and
+    # preview the result
+    def finishJob(self, job, queue, show=True):
+        job.release()
+        if queue.catalog:
+            port = job.name or (os.path.basename(serialPorts()[0][0]) if not SERIAL_IGNORE == True else '')
+            queue.catalog.record(job, self.captured, port, time.monotonic() - self.start, self.files)
+        if show and not queue.stopping and os.path.exists(self.preview):
+            self.showFile(self.preview)
+
+    # remove what a failed or cancelled render left of a file
+    def discard(self, partial):
         try:
-            subprocess.check_output(render_command, shell=True)
-        except subprocess.CalledProcessError as err:
-            self.logger.printConsole("ERROR: Failed to decode data using \"" + PCL_BINARY + "\" with error " + str(err) + "!", startNewLine=True)
-        if CONV_FORMAT == 'png' and PNG_PHOSPHOR == True:
-            self.logger.printConsole("Phosphor PNG mode enabled, processing...", startNewLine=True)
+            os.remove(partial)
+        except OSError:
+            pass
+
+    # move a completely written file into place, returns False if that failed
+    def complete(self, partial, file_name):
+        try:
+            os.replace(partial, file_name)
+        except OSError as err:
+            self.logger.printConsole("ERROR: Failed to move \"" + partial + "\" to \"" + file_name + "\" with error " + str(err) + "!", startNewLine=True)
+            return False
+        return True
+
+    # scale a rendered PNG down to at most THUMB_SIZE pixels for galleries, or rasterise the first page
+    # of a PDF at that size, and cache it. The phosphor look is applied after scaling down if the source
+    # doesn't have it yet
+    def thumbnail(self, source, file_name, queue, keys, phosphor=False):
+        loadImaging()
+        partial = partialName(file_name)
+        try:
+            if source.endswith('.pdf'):
+                with fitz.open(source) as document:
+                    page = document[0]
+                    zoom = THUMB_SIZE / max(page.rect.width, page.rect.height)
+                    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                    Image.frombytes("RGB", [pix.width, pix.height], pix.samples).save(partial, 'PNG')
+            else:
+                with Image.open(source) as image:
+                    image.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                    image.save(partial, 'PNG')
+        except (OSError, RuntimeError) as err:
+            self.logger.printConsole("ERROR: Failed to write thumbnail \"" + file_name + "\" with error " + str(err) + "!", startNewLine=True)
+            self.discard(partial)
+            return
+        if phosphor and PNG_PHOSPHOR == True:
+            self.phosphorFile(partial)
+        if self.complete(partial, file_name) and keys.get('thumb'):
+            queue.cache.store(keys['thumb'], file_name)
+
+    # give a rendered PNG the phosphor look, natively or using PNG_PHOSPHOR_CMD
+    def phosphorFile(self, file_name):
+        self.logger.printConsole("Phosphor PNG mode enabled, processing...", startNewLine=True)
+        try:
+            if PNG_PHOSPHOR_NATIVE == True:
+                loadImaging()
+            if PNG_PHOSPHOR_NATIVE == True and numpy:
+                with Image.open(file_name) as image:
+                    phosphor = self.phosphorImage(image)
+                phosphor.save(file_name)
+            else:
+                subprocess.run([PNG_PHOSPHOR_CMD, file_name] + shlex.split(PNG_PHOSPHOR_ARGS) + [file_name])
+        except OSError as err:
+            self.logger.printConsole("ERROR: Failed to run phosphor processing on file \"" + file_name + "\" with error " + str(err) + "!", startNewLine=True)
+
+    # decode screen dumps (PCL raster graphics only) in process and write the PNG and PDF files
+    # directly, returns False if the job has to go to the converter instead
+    def renderRaster(self, job, missing, queue, keys):
+        if any(conv_format not in ('png', 'pdf', 'thumb') for conv_format in missing) or job.data is None:
+            return False
+        loadImaging()
+        if not numpy:
+            return False
+        start = time.monotonic()
+        raster = PCLRaster()
+        bitmap = raster.decode(job.data)
+        if bitmap is None:
+            return False
+        job.release()
+        # surround the raster with a quarter inch of paper like a printed page, which also keeps the
+        # top left pixel blank for the phosphor conversion
+        margin = raster.resolution // 4
+        image = Image.fromarray(numpy.pad(numpy.where(bitmap, 0, 255).astype(numpy.uint8), margin, constant_values=255), 'L')
+        self.saveNative(job, image, raster.resolution, None, missing, queue, keys, str(bitmap.shape[1]) + "x" + str(bitmap.shape[0]) + " raster", start)
+        return True
+
+    # plot HP-GL jobs in process from the commands parsed while capturing and write the PNG, PDF and
+    # SVG files directly, returns False if the job has to go to the converter instead
+    def renderPlot(self, job, missing, queue, keys):
+        if any(conv_format not in ('png', 'pdf', 'svg', 'thumb') for conv_format in missing) or not job.commands:
+            return False
+        loadImaging()
+        if not numpy:
+            return False
+        start = time.monotonic()
+        plot = HPGLPlot()
+        if not plot.interpret(job.commands):
+            return False
+        job.release()
+        image = resolution = svg = None
+        if missing != ['svg']:
+            image, resolution = plot.image(HPGL_WIDTH, HPGL_PENS)
+        if 'svg' in missing:
+            svg = plot.svg(HPGL_PENS)
+        self.saveNative(job, image, resolution, svg, missing, queue, keys, str(len(plot.strokes)) + " lines and " + str(len(plot.labels)) + " labels", start)
+        return True
+
+    # write every missing format of a natively rendered job from the one image (and SVG document for
+    # plots), then post-process, cache and preview the files like converted ones
+    def saveNative(self, job, image, resolution, svg, missing, queue, keys, description, start):
+        screen = image
+        if image and PNG_PHOSPHOR == True and PNG_PHOSPHOR_NATIVE == True and 'png' in missing:
+            screen = self.phosphorImage(image)
+        written = []
+        for conv_format in missing:
+            file_name = self.files[conv_format]
+            partial = partialName(file_name)
             try:
-                subprocess.run(PNG_PHOSPHOR_CMD + ' ' + file_name + ' ' + PNG_PHOSPHOR_ARGS + ' ' + file_name, shell=True)
+                if conv_format == 'svg':
+                    with open(partial, 'w') as svgfile:
+                        svgfile.write(svg)
+                elif conv_format == 'pdf':
+                    image.save(partial, 'PDF', resolution=resolution)
+                elif conv_format == 'png':
+                    screen.save(partial, 'PNG', dpi=(resolution, resolution))
+                else:
+                    thumb = screen.copy()
+                    thumb.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                    if screen is image and PNG_PHOSPHOR == True and PNG_PHOSPHOR_NATIVE == True:
+                        # without a PNG, only the thumbnail needs the phosphor look, after scaling down
+                        thumb = self.phosphorImage(thumb)
+                    thumb.save(partial, 'PNG')
             except OSError as err:
-                self.logger.printConsole("ERROR: Failed to run phosphor processing on file \"" + file_name + "\" with error " + str(err) + "!", startNewLine=True)
+                self.logger.printConsole("ERROR: Failed to write \"" + file_name + "\" with error " + str(err) + "!", startNewLine=True)
+                self.discard(partial)
+                continue
+            if conv_format in ('png', 'thumb') and PNG_PHOSPHOR == True and not PNG_PHOSPHOR_NATIVE == True:
+                self.phosphorFile(partial)
+            if not self.complete(partial, file_name):
+                continue
+            written.append(file_name)
+            if keys.get(conv_format):
+                queue.cache.store(keys[conv_format], file_name)
+        if written:
+            self.logger.printConsole("Rendered " + description + " natively into " + ", ".join(written) + " in " + '{:.3f}'.format(time.monotonic() - start) + "s")
+        self.finishJob(job, queue)
+
+    # give an image the phosphor look in process, equivalent to the default PNG_PHOSPHOR_ARGS:
+    # -alpha on -fill "#00EE00" -draw 'color 0,0 replace' +level-colors green,black -auto-level
+    def phosphorImage(self, image):
+        pixels = numpy.array(image.convert('RGBA'))
+        # replace the background, i.e. every pixel with the color of the top left one
+        background = pixels[0, 0].copy()
+        pixels[(pixels == background).all(axis=2)] = (0x00, 0xEE, 0x00, 0xFF)
+        # map black to green (0x80) and white to black, only the green channel remains after that
+        green = 128 - pixels[..., 1] * numpy.float32(128 / 255)
+        # stretch the levels so the brightest green is at full scale
+        peak = green.max()
+        if peak > 0:
+            green *= 255 / peak
+        pixels[..., 0] = 0
+        pixels[..., 1] = numpy.rint(green)
+        pixels[..., 2] = 0
+        return Image.fromarray(pixels, 'RGBA')
+
+    # preview a rendered file natively or in the configured viewer
+    def showFile(self, file_name):
         if PREVIEW == True and not PREVIEW_NATIVE == True:
             self.logger.printConsole("Rendered file, launching viewer...", startNewLine=True)
             try:
-                subprocess.check_output(FILE_VIEWER + " " + file_name, shell=True)
-            except subprocess.CalledProcessError as err:
+                subprocess.Popen(shlex.split(FILE_VIEWER) + [file_name])
+            except OSError as err:
                 self.logger.printConsole("WARNING: Failed to launch viewer \"" + FILE_VIEWER + "\" with error " + str(err) + "!", startNewLine=True)
-        elif PREVIEW_NATIVE == True:
-            if CONV_FORMAT == 'png':
-                self.previewImage(file_name)
-            elif CONV_FORMAT == 'pdf':
-                self.previewPDF(file_name)
+        elif PREVIEW_NATIVE == True and self.gui:
+            # windows are created from the Tk loop rather than the render worker
+            extension = os.path.splitext(file_name)[1]
+            if extension == '.png':
+                self.gui.root.after(0, lambda: self.previewImage(file_name))
+            elif extension == '.pdf':
+                self.gui.root.after(0, lambda: self.previewPDF(file_name))
+            else:
+                self.logger.printConsole("No native preview for " + extension[1:] + " files, proceeding...", startNewLine=True)
         else:
             self.logger.printConsole("Preview disabled, proceeding...", startNewLine=True)
 
@@ -422,14 +2527,13 @@ class Trace():
         # display the file
         label.pack(fill='both', expand = 'YES')
 
-        # launch event handler for mass close in a thread
-        self.window = window
-        he = Thread(target=self.handleEvents)
-        he.start()
+        # register the window for mass close
+        self.gui.registerTrace(window)
 
     # preview window for PDF
     def previewPDF(self, file=''):
         page_num = 0
+        cache = {}
         # attempt to open file and get a matrix
         try:
             pdf = fitz.open(file)
@@ -450,10 +2554,31 @@ class Trace():
             else:
                 pass
 
+        # the page is only rasterised once per window, resizes are served from this copy
+        def cached_img():
+            if 'base' not in cache:
+                cache['base'] = pdf_to_img(page_num)
+            return cache['base']
+
+        # rasterise the page at the given size straight away and hand the samples to Tk as a PPM,
+        # which saves the intermediate PIL image and a resample
+        def pdf_to_tk(width, height):
+            page = pdf.load_page(0)
+            target = fitz.Matrix(width / page.rect.width, height / page.rect.height)
+            pix = page.get_pixmap(matrix=target, alpha=False)
+            return tk.PhotoImage(data=pix.tobytes("ppm"))
+
+        # put an image on the panel
+        def display(img_tk):
+            panel.config(image=img_tk)
+            panel.pack(side="bottom", fill="both", expand="yes")
+            frame.image = img_tk
+            frame.update_idletasks()
+
         # display the image of the PDF
         def show_image(event=False):
             try:
-                im = pdf_to_img(page_num)
+                im = cached_img()
                 img_tk = ImageTk.PhotoImage(im)
                 #panel = tk.Label(frame, image=img_tk)
                 panel.config(image=img_tk)
@@ -466,27 +2591,31 @@ class Trace():
                 #mb.showwarning(title="PCL dump " + version, detail="Failed to display PDF file")
                 window.destroy()
 
-        # resize the image by regenerating it
+        # resize the cached image with a fast, low quality resample while the window is being dragged
+        # and rasterise it again at the final size once that has settled for PREVIEW_SETTLE_MS
         def resize_image(event):
-            new_width = event.width
-            new_height = event.height
-            im = pdf_to_img(page_num)
-            im_scaled = im.resize((new_width, new_height), Image.ANTIALIAS)
-            img_tk = ImageTk.PhotoImage(im_scaled)
-            panel.config(image=img_tk)
-            panel.pack(side="bottom", fill="both", expand="yes")
-            frame.image = img_tk
-            frame.update_idletasks()
+            new_size = (event.width, event.height)
+            display(ImageTk.PhotoImage(cached_img().resize(new_size, Image.NEAREST)))
+            if cache.get('settle'):
+                window.after_cancel(cache['settle'])
+            cache['settle'] = window.after(PREVIEW_SETTLE_MS, lambda: settle_image(new_size))
+
+        # full quality rendering at the final size
+        def settle_image(new_size):
+            cache['settle'] = None
+            if window.winfo_exists():
+                display(pdf_to_tk(*new_size))
+
+        # drop a pending full quality rendering when the window is closed while a resize settles. The
+        # event also arrives for every widget in the window, only the window itself is of interest
+        def cancel_settle(event):
+            if event.widget is window and cache.get('settle'):
+                window.after_cancel(cache['settle'])
+                cache['settle'] = None
 
         # (re)turn document to 100% zoom factor
         def orig_size(event):
-            im = pdf_to_img(page_num)
-            img_tk = ImageTk.PhotoImage(im)
-            panel.config(image=img_tk)
-            panel.pack(side="bottom", fill="both", expand="yes")
-            #window.geometry()
-            frame.image = img_tk
-            frame.update_idletasks()
+            display(ImageTk.PhotoImage(cached_img()))
 
         # spawn new window
         window = tk.Toplevel()
@@ -511,24 +2640,13 @@ class Trace():
         panel = tk.Label(frame)
         scrollbar.config(command = canvas.yview)
         canvas.bind("<Configure>", resize_image)
+        window.bind('<Destroy>', cancel_settle)
         # render the PDF
         show_image()
         #pdf.close() # don't close the PDF handle as we need it for resizing
 
-        # launch event handler for mass close in a thread
-        self.window = window
-        he = Thread(target=self.handleEvents)
-        he.start()
-
-    # handle events for closing
-    def handleEvents(self):
-        while True:
-            time.sleep(0.5) # back off to prevent hogging a CPU core
-            global eventCloseTraces
-            if eventCloseTraces.is_set():
-                self.window.destroy()
-                time.sleep(1) # give the trace window threads time to pick up the event
-                eventCloseTraces.clear()
+        # register the window for mass close
+        self.gui.registerTrace(window)
 
 # logging
 class Logger:
@@ -536,8 +2654,26 @@ class Logger:
     def __init__(self, gui='', timestamps=False):
         self.timestamps = timestamps
         self.gui = gui
-
-    # console output with or without newline and dots
+        self.dots = '.' * 9
+        self.queue = queue.Queue(maxsize=LOG_QUEUE)
+        self.dropped = 0
+        self.updateGeometry()
+        # the terminal size only changes on SIGWINCH, which can only be handled from the main thread
+        try:
+            signal.signal(signal.SIGWINCH, lambda signum, frame: self.updateGeometry())
+        except ValueError:
+            pass
+        # a single thread writes to the console so that logging never waits for the terminal
+        co = Thread(target=self.consume, daemon=True)
+        co.start()
+
+    # detect terminal width in order to reserve characters for blanking
+    def updateGeometry(self):
+        columns = shutil.get_terminal_size().columns
+        self.justify_string = '{:<' + str(columns - 1) + '}'
+        self.blank_string = ' ' * columns
+
+    # console output with or without newline and dots, queued for the console thread
     def printConsole(self, text_string='', newLine=True, startNewLine=False, animateDots=False, logToGUI=True, GUIOnly=False):
         loggui = self.gui
         if self.timestamps == True:
@@ -545,48 +2681,66 @@ class Logger:
             log_prefix = '[' + now.strftime("%Y-%m-%d %H:%M:%S") + '] '
             text_string = log_prefix + text_string
         if GUIOnly == True:
-            if NATIVE_LOGGER == True:
+            if loggui and NATIVE_LOGGER == True:
                 loggui.logLine(text_string)
         else:
-            # detect terminal width in order to reserve characters for blanking
-            rows, columns = os.popen('stty size', 'r').read().split()
-            justify_string = '{:<' + str(int(columns)-1) + '}'
+            justify_string = self.justify_string
             if startNewLine == True:
                 text_string = '\r\n' + text_string
             if newLine == True:
-                print(justify_string.format(text_string), flush=True, end='\r\n')
-                if NATIVE_LOGGER == True and not logToGUI == False:
+                self.write(justify_string.format(text_string) + '\r\n')
+                if loggui and NATIVE_LOGGER == True and not logToGUI == False:
                     loggui.logLine(text_string)
             else:
                 if animateDots == True:
                     # clear the line before printing on it again
-                    blank_string = ''
-                    i = 0
-                    while i < int(columns):
-                        blank_string += ' '
-                        i += 1
-                    print(justify_string.format(blank_string), end='\r')
-                    now = datetime.datetime.now()
-                    seconds = int(now.strftime("%S")[-1:])
-                    dots = '.'
-                    i = 1
-                    while i < seconds:
-                        dots += '.'
-                        i += 1
-                    print(justify_string.format(text_string + dots), end='\r', flush=True)
+                    seconds = datetime.datetime.now().second % 10
+                    dots = self.dots[:max(seconds, 1)]
+                    self.write(justify_string.format(self.blank_string) + '\r' + justify_string.format(text_string + dots) + '\r')
                 else:
-                    print(justify_string.format(text_string), end='\r', flush=True)
-                    if NATIVE_LOGGER == True and not logToGUI == False:
+                    self.write(justify_string.format(text_string) + '\r')
+                    if loggui and NATIVE_LOGGER == True and not logToGUI == False:
                         loggui.logLine(text_string)
-        # update the window anyway
-        self.gui.refresh()
+
+    # hand output to the console thread, dropping it rather than waiting when the queue is full
+    def write(self, output):
+        try:
+            self.queue.put_nowait(output)
+        except queue.Full:
+            self.dropped += 1
+
+    # console thread, writes whatever is pending in a single batch
+    def consume(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            queued = len(batch)
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                batch.append(self.justify_string.format("(" + str(dropped) + " log lines dropped)") + '\r\n')
+            sys.stdout.write(''.join(batch))
+            sys.stdout.flush()
+            for output in range(queued):
+                self.queue.task_done()
+
+    # wait briefly for pending output to reach the console, e.g. before exiting
+    def flush(self, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
 
 # input handling
 class Input(Logger, SerialListener):
 
-    def __init__(self, Logger, SerialListener):
+    def __init__(self, Logger, SerialListeners):
         self.logger = Logger
-        self.seriallistener = SerialListener
+        self.seriallisteners = SerialListeners
+        self.seriallistener = SerialListeners[0]
+        self.capture = None             # event loop capture core (-a), if running
 
     # determine keypress
     def getCh(self):
@@ -606,17 +2760,15 @@ class Input(Logger, SerialListener):
             char = self.getCh()
             if (char.lower() == "q"):
                 self.logger.printConsole("Quit signal received, exiting...", startNewLine=True)
-                time.sleep(0.5)
-                self.logger.printConsole("Goodbye")
-                os._exit(0)
+                self.quit()
 
             if (char.lower() == "p"):
                 self.logger.printConsole("Pause received, aborting capture...", startNewLine=True, logToGUI=False)
-                self.seriallistener.startStopSerial(mode='stop')
+                self.serialControl(command='stop')
 
             if (char.lower() == "r"):
                 self.logger.printConsole("Resume received, resuming serial capture...", startNewLine=True, logToGUI=False)
-                self.seriallistener.startStopSerial(mode='start')
+                self.serialControl(command='start')
 
             if (char.lower() == "i"):
                 self.displayParams()
@@ -624,24 +2776,60 @@ class Input(Logger, SerialListener):
             if (char.lower() == "h" or char == "F1"):
                 self.displayHelp()
 
+    # stop capturing and rendering, then exit. Pending renders are dropped and running ones finished
+    # (or their converters killed with -a), so no converter or partial file is left behind
+    def quit(self):
+        if self.capture:
+            self.capture.stop()
+            self.capture.done.wait()
+        elif self.seriallistener.renderqueue:
+            if self.seriallistener.renderqueue.depth:
+                self.logger.printConsole("Waiting for running renders...", startNewLine=True)
+            self.seriallistener.renderqueue.stop()
+        self.logger.printConsole("Goodbye")
+        self.logger.flush()
+        os._exit(0)
+
     # handle GUI input
     def serialControl(self, command):
-        if (command == 'stop'):
-            self.seriallistener.startStopSerial(mode='stop')
-        elif (command == 'start'):
-            self.seriallistener.startStopSerial(mode='start')
+        for listener in self.seriallisteners:
+            if (command == 'stop'):
+                listener.startStopSerial(mode='stop')
+            elif (command == 'start'):
+                listener.startStopSerial(mode='start')
 
     # show operating parameters
     def displayParams(self):
-        self.logger.printConsole("Serial params:        " + SERIAL_PORT + " @ " + str(SERIAL_RATE) + " using a " + str(TIMEOUT_S) + "s timeout", startNewLine=True)
+        for listener in self.seriallisteners:
+            self.logger.printConsole("Serial params:        " + listener.port + " @ " + str(listener.speed) + " using a " + str(TIMEOUT_S) + "s timeout", startNewLine=listener is self.seriallisteners[0])
+        self.logger.printConsole("Capture chunks:       up to " + str(CAPTURE_CHUNK) + " bytes per read (" + str(CAPTURE_TIMEOUT) + "s read timeout)")
         if KEEP_BUFFER == True:
             buffer_persistence = " with persistence"
         else:
             buffer_persistence = " without persistence"
-        self.logger.printConsole("Buffer on disk:       " + BUFFER_FILE + buffer_persistence)
-        self.logger.printConsole("Render options:       " + CONV_FORMAT.upper() + " (using \"" + PCL_BINARY + "\" with \"" + PCL_ARGS + "\")")
+        for listener in self.seriallisteners:
+            self.logger.printConsole("Buffer on disk:       " + listener.bufferfile + buffer_persistence + " (jobs over " + str(BUFFER_SPILL) + " bytes are kept on disk)")
+        if JOB_SPLIT == True:
+            job_boundaries = "PCL reset, PJL exit" + (", end of raster graphics" if JOB_SPLIT_RASTER == True else "") + ", HP-GL IN/PG/SP0 or "
+        else:
+            job_boundaries = ""
+        self.logger.printConsole("Job boundaries:       " + job_boundaries + str(TIMEOUT_S) + "s timeout")
+        self.logger.printConsole("Render options:       " + ", ".join(convFormats()).upper() + (" and " + str(THUMB_SIZE) + "px thumbnails" if THUMB_SIZE else "") + " (using \"" + PCL_BINARY + "\" with \"" + PCL_ARGS + "\")")
+        native = [name for name, enabled in (("raster screen dumps", RASTER_NATIVE), ("HP-GL plots", HPGL_NATIVE)) if enabled == True]
+        if native:
+            self.logger.printConsole("Native rendering:     " + " and ".join(native) + " (other jobs use \"" + PCL_BINARY + "\")")
+        if self.seriallistener.renderqueue:
+            self.logger.printConsole("Render queue:         " + self.seriallistener.renderqueue.describe())
+            if self.seriallistener.renderqueue.cache:
+                self.logger.printConsole("Render cache:         " + self.seriallistener.renderqueue.cache.describe())
+            if self.seriallistener.renderqueue.catalog:
+                self.logger.printConsole("Trace catalog:        " + self.seriallistener.renderqueue.catalog.describe())
         self.logger.printConsole("File storage:         " + FILE_DIR + " (using \"" + FILE_BASENAME + "\" as the prefix)")
         self.logger.printConsole("Preview:              " + str(PREVIEW) + " (using \"" + FILE_VIEWER + "\" to display files)")
+        if HEADLESS == True:
+            self.logger.printConsole("Mode:                 headless (no GUI or native previews)")
+        if CAPTURE_ASYNC == True:
+            self.logger.printConsole("Capture core:         asyncio event loop (single thread for all ports and converter runs)")
         time.sleep(0.3)
 
     # display help in CLI
@@ -667,10 +2855,15 @@ class ArgHandler:
         parser = argparse.ArgumentParser(description="Scope dump")
         parser.add_argument('-n', help='Ignore serial port absence', action="store_true")
         parser.add_argument('-k', help='Keep buffer on disk', action="store_true")
-        parser.add_argument('-p', type=str, metavar='[/dev/ttyS0]', help="Override serial port", required=False)
-        parser.add_argument('-s', type=int, metavar='[baud]', help="Override serial speed", required=False)
+        parser.add_argument('-p', type=str, metavar='[/dev/ttyS0]', help="Override serial port, separate several ports with commas", required=False)
+        parser.add_argument('-s', type=str, metavar='[baud]', help="Override serial speed, separate speeds per port with commas", required=False)
         parser.add_argument('-f', type=str, metavar='[/tmp/raw]', help="Override buffer file", required=False)
         parser.add_argument('-o', type=str, metavar='[/tmp/tek2]', help="Override output directory", required=False)
+        parser.add_argument('-c', type=int, metavar='[bytes]', help="Override serial read chunk size", required=False)
+        parser.add_argument('-w', type=int, metavar='[workers]', help="Override number of render workers", required=False)
+        parser.add_argument('-d', '--headless', help='Run without GUI (capture and render only)', action="store_true")
+        parser.add_argument('-a', '--asyncio', help='Capture and render from a single asyncio event loop', action="store_true")
+        parser.add_argument('-q', '--query', type=str, nargs='?', const='', metavar='[filter]', help="List the traces in the catalog matching every word of the filter and exit", required=False)
         parser.add_argument('-v', '--version', help='Show version and exit', default=False, action='version', version=version)
         args = parser.parse_args()
 
@@ -686,61 +2879,191 @@ class ArgHandler:
             SERIAL_PORT = args.p
         if args.s:
             global SERIAL_RATE
-            SERIAL_RATE = args.s
+            SERIAL_RATE = [int(rate) for rate in args.s.split(',')]
         if args.f:
             global BUFFER_FILE
             BUFFER_FILE = args.f
         if args.o:
             global FILE_DIR
             FILE_DIR = args.o
+        if args.c:
+            global CAPTURE_CHUNK
+            CAPTURE_CHUNK = args.c
+        if args.w:
+            global RENDER_WORKERS
+            RENDER_WORKERS = args.w
+        if args.headless:
+            global HEADLESS
+            HEADLESS = True
+        if args.asyncio:
+            global CAPTURE_ASYNC
+            CAPTURE_ASYNC = True
+        if args.query is not None:
+            global QUERY
+            QUERY = args.query
+
+# the serial ports to capture from as (port, speed, buffer file, name, instrument) tuples. The name and
+# a buffer file of its own are only used when capturing from several ports
+def serialPorts():
+    ports = SERIAL_PORT.split(',') if isinstance(SERIAL_PORT, str) else list(SERIAL_PORT)
+    rates = list(SERIAL_RATE) if isinstance(SERIAL_RATE, (list, tuple)) else [SERIAL_RATE]
+    rates += rates[-1:] * (len(ports) - len(rates))
+    instruments = list(FILE_TAG) if isinstance(FILE_TAG, (list, tuple)) else [FILE_TAG]
+    instruments += [''] * (len(ports) - len(instruments))
+    if SERIAL_IGNORE == True or len(ports) == 1:
+        # without a serial port, there is only the buffer file to follow
+        return [(ports[0], rates[0], BUFFER_FILE, '', instruments[0])]
+    root, extension = os.path.splitext(BUFFER_FILE)
+    names = [os.path.basename(port) for port in ports]
+    return [(port, rate, root + '_' + name + extension, name, instrument) for port, rate, name, instrument in zip(ports, rates, names, instruments)]
+
+# the name a file is written under until it is complete, then it is renamed with os.replace so that
+# viewers and other workers never see it half written. Hidden, and the extension is kept for converters
+# which pick the output format from it
+def partialName(file_name):
+    directory, base = os.path.split(file_name)
+    root, extension = os.path.splitext(base)
+    return os.path.join(directory, '.' + root + '.partial' + extension)
+
+# the trace catalog database
+def catalogFile():
+    return CATALOG_FILE or os.path.join(FILE_DIR, '.scope_catalog.sqlite')
+
+# print the traces in the catalog matching the filter given with -q, newest first
+def listTraces(text_filter):
+    catalog = TraceCatalog(catalogFile(), readonly=True)
+    if not catalog.connection:
+        print("No trace catalog at " + catalog.path)
+        return
+    rows = catalog.query(text_filter.split(), limit=CATALOG_LIMIT)
+    print('{:<8} {:<23} {:<16} {:<6} {:>9} {:>8}  {}'.format("ID", "Captured", "Port", "Lang", "Bytes", "Render", "File"))
+    for job_id, captured, port, instrument, size, job_hash, language, reason, render_time, preview, thumbnail in rows:
+        captured = datetime.datetime.fromtimestamp(captured).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        print('{:<8} {:<23} {:<16} {:<6} {:>9} {:>7.3f}s  {}'.format(job_id, captured, ' '.join(filter(None, (instrument, port))) or '-',
+            language or '-', size, render_time or 0, preview or '(not rendered)'))
+    print(str(len(rows)) + " traces" + (" (limited to " + str(CATALOG_LIMIT) + ")" if len(rows) == CATALOG_LIMIT else "") + " in " + catalog.path)
+
+# the formats each job is rendered to, the first one is previewed
+def convFormats():
+    return CONV_FORMAT.split(',') if isinstance(CONV_FORMAT, str) else list(CONV_FORMAT)
+
+# the format thumbnails are scaled down from: the PNG if the job is rendered to PNG anyway, otherwise the
+# PDF rasterised with MuPDF. None if the thumbnail takes a converter run of its own
+def thumbSource():
+    formats = convFormats()
+    if 'png' in formats:
+        return 'png'
+    if 'pdf' in formats:
+        loadPDF()
+        if fitz:
+            return 'pdf'
+    return None
+
+# converter arguments for a format: PCL_ARGS for the first one in CONV_FORMAT, PCL_FORMAT_ARGS for the
+# others. Thumbnails are rendered as PNG
+def formatArgs(conv_format):
+    if conv_format == 'thumb':
+        conv_format = 'png'
+    if conv_format == convFormats()[0]:
+        return PCL_ARGS
+    return PCL_FORMAT_ARGS.get(conv_format, PCL_ARGS)
 
 # main task launches the threads for the GUI, timer, input and serial listener
 def main():
-    root = tk.Tk()  # define root window in order to be able to create global StringVars
     args = ArgHandler()
     args.handleArgs()
-    main_gui = GUI(root)
+    if QUERY is not None:
+        listTraces(QUERY)
+        return
+    main_gui = None
+    if not HEADLESS == True:
+        loadGUI()
+        root = tk.Tk()  # define root window in order to be able to create global StringVars
+        main_gui = GUI(root)
     logger = Logger(gui=main_gui, timestamps=OUTPUT_DATETIME)
-    serial = SerialListener(port=SERIAL_PORT, speed=SERIAL_RATE, bufferfile=BUFFER_FILE, logger=logger)
-    input = Input(logger, serial)
-    main_gui.mainWindow(root, input)
+    rendercache = None
+    if CACHE_SIZE:
+        rendercache = RenderCache(CACHE_DIR or os.path.join(FILE_DIR, '.scope_cache'), CACHE_SIZE, logger)
+    catalog = None
+    if CATALOG == True:
+        catalog = TraceCatalog(catalogFile(), logger)
+        if main_gui:
+            main_gui.catalog = catalog
+    if CAPTURE_ASYNC == True:
+        renderqueue = AsyncRenderQueue(RENDER_WORKERS, logger, cache=rendercache, catalog=catalog)
+    else:
+        renderqueue = RenderQueue(RENDER_WORKERS, logger, cache=rendercache, catalog=catalog)
+    # one listener with its own buffer and job detection per port, all sharing the render queue
+    serials = []
+    for port, speed, bufferfile, name, instrument in serialPorts():
+        serials.append(SerialListener(port=port, speed=speed, bufferfile=bufferfile, logger=logger, renderqueue=renderqueue, name=name, instrument=instrument))
+    input = Input(logger, serials)
+
+    # start capturing right away, everything else can happen while data comes in
+    listeners = []
+    capture = None
+    if CAPTURE_ASYNC == True:
+        # a single event loop thread serves all ports, job timers, startup commands and renders
+        logger.printConsole("Starting capture event loop thread...")
+        capture = AsyncCapture(serials, logger, renderqueue, gui=main_gui)
+        input.capture = capture
+        cl = Thread(target=capture.serve)
+        cl.start()
+        listeners.append(cl)
+    for serial in (serials if not capture else []):
+        logger.printConsole(serial.tag + "Starting serial listener thread...")
+        sl = Thread(target=serial.listenSerial, args=(serialPause,)) # do not forget the trailing comma
+        sl.start()
+        listeners.append(sl)
+
+        # timer for serial monitor
+        logger.printConsole(serial.tag + "Starting timer thread...")
+        t = Thread(target=serial.timerRun, args=(main_gui,))
+        t.start()
+
+    if main_gui:
+        main_gui.mainWindow(root, input)
     input.displayVersion()
 
     # display config
     input.displayParams()
 
-    logger.printConsole("Hotkeys: [P] to [p]ause capture, [R] to [r]esume capture, [I] to display [i]nformation, [Q] to [q]uit", startNewLine=True)
-    logger.printConsole("         Press [H] or [F1] for help")
-
-    # send optional startup commands to serial interface
-    if not SERIAL_IGNORE == True:
-        logger.printConsole("Executing any startup commands...")
-        for command in COMMANDS_STARTUP:
-            time.sleep(COMMANDS_DELAY)
-            logger.printConsole("Sending startup command " + command.replace('\r', '').replace('\n', '') + "...")
-            serial.sendMessage(command=command)
-
-    # timer for serial monitor
-    logger.printConsole("Starting timer thread...", startNewLine=True)
-    t = Thread(target=serial.timerRun, args=(main_gui,))
-    t.start()
-
-    # set up keyboard input handling
-    logger.printConsole("Starting keyboard input thread...")
-    ki = Thread(target=input.handleInput)
-    ki.start()
-
-    # set up the serial listener thread
-    logger.printConsole("Starting serial listener thread...")
-    sl = Thread(target=serial.listenSerial, args=(serialPause,)) # do not forget the trailing comma
-    sl.start()
-
-    # run the GUI thread/loop
-    logger.printConsole("Launching GUI thread...")
-    wl = Thread(target=root.mainloop())
-    wl.start()
-
-    os._exit(0)
+    if main_gui or sys.stdin.isatty():
+        logger.printConsole("Hotkeys: [P] to [p]ause capture, [R] to [r]esume capture, [I] to display [i]nformation, [Q] to [q]uit", startNewLine=True)
+        logger.printConsole("         Press [H] or [F1] for help")
+
+    # send optional startup commands to serial interface in the background
+    if not SERIAL_IGNORE == True and COMMANDS_STARTUP and not capture:
+        logger.printConsole("Executing any startup commands...", startNewLine=True)
+        for serial in serials:
+            sc = Thread(target=serial.sendStartup, args=(COMMANDS_STARTUP, COMMANDS_DELAY))
+            sc.start()
+
+    # set up keyboard input handling, unless running headless without a terminal
+    if main_gui or sys.stdin.isatty():
+        logger.printConsole("Starting keyboard input thread...")
+        ki = Thread(target=input.handleInput)
+        ki.start()
+
+    if main_gui:
+        # run the GUI thread/loop
+        logger.printConsole("Launching GUI thread...")
+        wl = Thread(target=root.mainloop())
+        wl.start()
+    else:
+        # headless, keep capturing until interrupted or terminated
+        logger.printConsole("Running headless, send SIGINT or SIGTERM to exit")
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            if capture:
+                capture.done.wait()
+            else:
+                listeners[0].join()
+        except (KeyboardInterrupt, SystemExit):
+            logger.printConsole("Signal received, exiting...", startNewLine=True)
+
+    # cancel pending renders and startup commands and close the ports before leaving
+    input.quit()
 
 if __name__ == "__main__":
     main()
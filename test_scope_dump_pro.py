@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+#
+# Tests for the job detection and native rendering of Scope dump Pro. Jobs are fed through a JobBuffer
+# the way the serial listener does it, so they arrive as bytearrays like captured ones.
+#
+# Run with: python3 -m pytest -q
+#
+import asyncio
+import concurrent.futures
+import os
+import time
+
+import pytest
+
+import scope_dump_pro
+
+
+# collects log output of the utility
+class ListLogger:
+
+    def __init__(self):
+        self.lines = []
+
+    def printConsole(self, text_string='', *args, **kwargs):
+        self.lines.append(text_string)
+
+    def flush(self, timeout=1.0):
+        pass
+
+# a screen dump of three raster rows: uncompressed, run length encoded and delta row compressed
+RASTER_JOB = b'\x1bE\x1b*t100R\x1b*r24S\x1b*r1A' + \
+    b'\x1b*b0M\x1b*b3W\xff\x00\xff' + \
+    b'\x1b*b1m2W\x02\xf0' + \
+    b'\x1b*b3m2W\x01\x0f' + \
+    b'\x1b*rB\x1bE'
+
+
+# capture data through a job buffer with the given tokenizer and return the completed jobs
+def capture(data, tokenizer, chunk=7):
+    buffer = scope_dump_pro.JobBuffer('/tmp/scope_test.dump', ListLogger(), tokenizer=tokenizer)
+    for offset in range(0, len(data), chunk):
+        buffer.append(data[offset:offset + chunk])
+    jobs = []
+    job = buffer.takeJob()
+    while job:
+        jobs.append(job)
+        job = buffer.takeJob()
+    idle = buffer.finishIdle()
+    if idle:
+        jobs.append(idle)
+    return jobs
+
+
+@pytest.fixture
+def output(tmp_path, monkeypatch):
+    monkeypatch.setattr(scope_dump_pro, 'FILE_DIR', str(tmp_path))
+    monkeypatch.setattr(scope_dump_pro, 'PREVIEW', False)
+    monkeypatch.setattr(scope_dump_pro, 'SERIAL_IGNORE', True)
+    return tmp_path
+
+
+def test_job_stays_in_memory_below_spill_size(tmp_path):
+    buffer = scope_dump_pro.JobBuffer(str(tmp_path / 'scope.dump'), ListLogger(), spillsize=64)
+    buffer.append(b'x' * 40)
+    buffer.append(b'y' * 24)
+    job = buffer.finishIdle()
+    assert job.data == b'x' * 40 + b'y' * 24 and job.path is None and job.size == 64
+    assert not os.listdir(tmp_path)
+
+
+def test_large_job_spills_to_disk(tmp_path):
+    logger = ListLogger()
+    buffer = scope_dump_pro.JobBuffer(str(tmp_path / 'scope.dump'), logger, spillsize=64)
+    for chunk in range(10):
+        buffer.append(bytes([chunk]) * 10)
+    job = buffer.finishIdle()
+    assert job.data is None and job.size == 100
+    with open(job.path, 'rb') as spillfile:
+        assert spillfile.read() == b''.join(bytes([chunk]) * 10 for chunk in range(10))
+    assert logger.lines == ['Job exceeds 64 bytes, moved buffer to disk']
+    job.release()
+    assert not os.listdir(tmp_path)
+    # the next job starts in memory again
+    buffer.append(b'z')
+    assert buffer.finishIdle().data == b'z'
+
+
+def test_buffer_file_only_written_when_kept(tmp_path):
+    bufferfile = tmp_path / 'scope.dump'
+    buffer = scope_dump_pro.JobBuffer(str(bufferfile), ListLogger(), persist=True)
+    buffer.append(b'first')
+    buffer.finishIdle()
+    buffer.append(b'second')
+    buffer.finishIdle()
+    assert bufferfile.read_bytes() == b'firstsecond'
+
+
+def test_job_completes_once_idle(tmp_path):
+    buffer = scope_dump_pro.JobBuffer(str(tmp_path / 'scope.dump'), ListLogger())
+    assert buffer.finishIdle() is None
+    reports = []
+    scope_dump_pro.Thread(target=lambda: (time.sleep(0.05), buffer.append(b'Hello\x0c')), daemon=True).start()
+    start = time.monotonic()
+    job = buffer.waitComplete(0.2, scope_dump_pro.Event(), reports.append)
+    assert time.monotonic() - start >= 0.2
+    assert bytes(job.data) == b'Hello\x0c' and job.reason == 'timeout'
+    assert reports == ['idle', 6]
+    assert buffer.size == 0
+
+
+def test_leftovers_after_boundary_are_discarded(tmp_path):
+    logger = ListLogger()
+    buffer = scope_dump_pro.JobBuffer(str(tmp_path / 'scope.dump'), logger, tokenizer=scope_dump_pro.PCLTokenizer())
+    buffer.append(b'\x1bEHello\x0c\x1bE\x1b%-12345X@PJL EOJ\r\n')
+    assert bytes(buffer.takeJob().data) == b'\x1bEHello\x0c\x1bE'
+    assert buffer.finishIdle() is None
+    assert logger.lines[-1] == 'Discarded 19 bytes of PCL without anything to render'
+
+
+def test_raster_job_from_buffer_decodes():
+    pytest.importorskip('numpy')
+    scope_dump_pro.loadImaging()
+    jobs = capture(RASTER_JOB, scope_dump_pro.AutoTokenizer())
+    assert len(jobs) == 1
+    assert isinstance(jobs[0].data, bytearray)
+    bitmap = scope_dump_pro.PCLRaster().decode(jobs[0].data)
+    assert bitmap.shape == (3, 24)
+    assert bitmap[0].tolist() == [1] * 8 + [0] * 8 + [1] * 8
+    assert bitmap[1].tolist() == [1, 1, 1, 1, 0, 0, 0, 0] * 3
+    assert bitmap[2].tolist() == [1, 1, 1, 1, 0, 0, 0, 0] + [0, 0, 0, 0, 1, 1, 1, 1] + [1, 1, 1, 1, 0, 0, 0, 0]
+
+
+def test_text_is_not_raster():
+    pytest.importorskip('numpy')
+    scope_dump_pro.loadImaging()
+    assert scope_dump_pro.PCLRaster().decode(bytearray(b'\x1bE\x1b&l0OHello\x0c\x1bE')) is None
+
+
+def test_raster_job_from_buffer_renders(output, monkeypatch):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(scope_dump_pro, 'CONV_FORMAT', ['pdf', 'png'])
+    monkeypatch.setattr(scope_dump_pro, 'THUMB_SIZE', 64)
+    job = capture(RASTER_JOB, scope_dump_pro.AutoTokenizer())[0]
+    logger = ListLogger()
+    queue = scope_dump_pro.RenderQueue(1, logger)
+    trace = scope_dump_pro.Trace()
+    concurrent.futures.wait(trace.renderFile(None, logger, job, queue))
+    for file_name in trace.files.values():
+        assert os.path.getsize(file_name)
+    assert not [name for name in os.listdir(output) if '.partial' in name]
+
+
+def test_phosphor_of_known_bitmap():
+    pytest.importorskip('numpy')
+    scope_dump_pro.loadImaging()
+    # white background, black and grey trace
+    image = scope_dump_pro.Image.frombytes('L', (4, 2), bytes([255, 0, 128, 255, 255, 255, 0, 64]))
+    pixels = scope_dump_pro.numpy.asarray(scope_dump_pro.Trace().phosphorImage(image))
+    assert pixels[..., 1].tolist() == [[17, 255, 127, 17], [17, 17, 255, 191]]
+    assert not pixels[..., 0].any() and not pixels[..., 2].any()
+    assert (pixels[..., 3] == 255).all()
+
+
+def test_phosphor_matches_imagemagick(tmp_path):
+    pytest.importorskip('numpy')
+    if not os.access(scope_dump_pro.PNG_PHOSPHOR_CMD, os.X_OK):
+        pytest.skip(scope_dump_pro.PNG_PHOSPHOR_CMD + ' is not installed')
+    scope_dump_pro.loadImaging()
+    from PIL import Image, ImageDraw
+    # a trace with antialiased edges and a grid, like a rendered screen dump
+    image = Image.new('L', (320, 240), 255)
+    draw = ImageDraw.Draw(image)
+    for x in range(0, 320, 32):
+        draw.line((x, 0, x, 239), fill=160)
+    draw.line([(x, 120 + int(80 * ((x % 64) - 32) / 32)) for x in range(0, 320, 4)], fill=0, width=3)
+    image = image.resize((640, 480), Image.BILINEAR)
+    source = str(tmp_path / 'trace.png')
+    magick_file = str(tmp_path / 'magick.png')
+    image.save(source)
+    scope_dump_pro.subprocess.run([scope_dump_pro.PNG_PHOSPHOR_CMD, source] + scope_dump_pro.shlex.split(scope_dump_pro.PNG_PHOSPHOR_ARGS) + [magick_file], check=True)
+    with Image.open(magick_file) as magick:
+        expected = scope_dump_pro.numpy.asarray(magick.convert('RGBA'), dtype=int)
+    native = scope_dump_pro.numpy.asarray(scope_dump_pro.Trace().phosphorImage(image), dtype=int)
+    assert abs(expected - native).max() <= 2
+
+
+def test_pcl_jobs_split_at_reset():
+    jobs = capture(b'\x1bEfirst page\x0c\x1bE\x1bEsecond page\x0c\x1bE', scope_dump_pro.AutoTokenizer())
+    assert [bytes(job.data) for job in jobs] == [b'\x1bEfirst page\x0c\x1bE', b'\x1bEsecond page\x0c\x1bE']
+    assert [job.reason for job in jobs] == ['reset', 'reset']
+    assert jobs[0].language == 'PCL'
+
+
+def test_pcl_plane_data_is_not_parsed():
+    # colour raster planes (ESC*b#V) whose binary data contains a reset and a UEL
+    job = b'\x1bE\x1b*r3U\x1b*r1A\x1b*b2V\x1bE\x1b*b6V\x1b%-12345X\x1b*b0W\x1b*rC\x1bE'
+    jobs = capture(job, scope_dump_pro.PCLTokenizer(split_raster=False))
+    assert [bytes(job.data) for job in jobs] == [job]
+
+
+def test_hpgl_jobs_split_and_leftovers_dropped():
+    plot = b'IN;SP1;PU0,0;PD100,100;PU;'
+    jobs = capture(plot + b'SP0;' + plot + b'PG;PU;', scope_dump_pro.AutoTokenizer())
+    assert [job.reason for job in jobs] == ['pen', 'page']
+    assert [job.language for job in jobs] == ['HP-GL', 'HP-GL']
+    assert ('PD', [100.0, 100.0]) in jobs[1].commands
+
+
+@pytest.mark.parametrize('data, language', [
+    (b'\x1bE\x1b&l0OHello\x0c\x1bE', 'PCL'),
+    (b'\x1b%-12345X@PJL ENTER LANGUAGE=PCL\r\n\x1bEHello\x0c\x1bE', 'PCL'),
+    (b'IN;SP1;PA0,0;PD100,100;SP0;', 'HP-GL'),
+    (b'\r\n;in;sp1;pd100,100;sp0;', 'HP-GL'),
+    (b'\x1b.(\x1b.I81;;17:IN;SP1;PD100,100;SP0;', 'HP-GL'),
+    (b'Hello world, this is a plain text printout.\r\n\x0c', None),
+])
+def test_language_detected_from_first_bytes(data, language):
+    jobs = capture(data, scope_dump_pro.AutoTokenizer())
+    assert len(jobs) == 1
+    assert bytes(jobs[0].data) == data
+    assert jobs[0].language == language
+
+
+@pytest.mark.parametrize('chunk', [1, 3, 7, 64])
+def test_language_detected_for_every_job(chunk):
+    pcl = b'\x1bEHello\x0c\x1bE'
+    plot = b'IN;SP1;PU0,0;PD100,100;PG;'
+    jobs = capture(pcl + plot + pcl + pcl + plot, scope_dump_pro.AutoTokenizer(), chunk)
+    assert [bytes(job.data) for job in jobs] == [pcl, plot, pcl, pcl, plot]
+    assert [job.language for job in jobs] == ['PCL', 'HP-GL', 'PCL', 'PCL', 'HP-GL']
+    assert [job.reason for job in jobs] == ['reset', 'page', 'reset', 'reset', 'page']
+    assert [bool(job.commands) for job in jobs] == [False, True, False, False, True]
+
+
+# HP-GL jobs split at IN wherever the chunks of the serial port happen to end
+@pytest.mark.parametrize('spillsize', [0, 5])
+def test_hpgl_jobs_split_at_in_for_every_chunk_size(spillsize):
+    plot = b'IN;SP1;PU0,0;PD100,100;PU;'
+    data = plot + b'\r\n' + plot + plot
+    for chunk in range(1, len(data) + 1):
+        buffer = scope_dump_pro.JobBuffer('/tmp/scope_test.dump', ListLogger(), spillsize=spillsize, tokenizer=scope_dump_pro.AutoTokenizer())
+        for offset in range(0, len(data), chunk):
+            buffer.append(data[offset:offset + chunk])
+        jobs = [buffer.takeJob(), buffer.takeJob(), buffer.finishIdle()]
+        contents = []
+        for job in jobs:
+            contents.append(open(job.path, 'rb').read() if job.path else bytes(job.data))
+            job.release()
+        assert contents == [plot + b'\r\n', plot, plot], chunk
+        assert [job.commands[0] for job in jobs] == [('IN', [])] * 3, chunk
+
+
+def test_plain_text_is_rendered():
+    text = b'Hello world, this is a plain text printout.\r\n\x0c'
+    jobs = capture(text, scope_dump_pro.AutoTokenizer())
+    assert len(jobs) == 1
+    assert bytes(jobs[0].data) == text
+    assert jobs[0].reason == 'timeout'
+    assert jobs[0].language is None
+
+
+# a converter standing in for gpcl6, it writes a blank page in the format of the output file
+CONVERTER = '''#!/usr/bin/env python3
+import os
+import sys
+import time
+from PIL import Image
+sys.stdin.buffer.read()
+time.sleep(float(os.environ.get('CONVERTER_DELAY', 0)))
+output = sys.argv[-2]
+Image.new('L', (200, 100), 255).save(output, 'PDF' if output.endswith('.pdf') else 'PNG')
+'''
+
+
+# wait for the converter runs of a trace, which are queued from the workers
+def wait_for_files(trace, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not all(os.path.exists(file_name) for file_name in trace.files.values()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def converter(output, tmp_path_factory, monkeypatch):
+    path = tmp_path_factory.mktemp('bin') / 'converter'
+    path.write_text(CONVERTER)
+    path.chmod(0o755)
+    monkeypatch.setattr(scope_dump_pro, 'PCL_BINARY', str(path))
+    monkeypatch.setattr(scope_dump_pro, 'PCL_ARGS', '-o')
+    monkeypatch.setattr(scope_dump_pro, 'PCL_FORMAT_ARGS', {})
+    monkeypatch.setattr(scope_dump_pro, 'CONV_FORMAT', ['pdf', 'png'])
+    monkeypatch.setattr(scope_dump_pro, 'THUMB_SIZE', 64)
+    return path
+
+
+def test_converter_renders_in_workers(converter, output):
+    job = capture(b'Hello world, this is a plain text printout.\r\n\x0c', scope_dump_pro.AutoTokenizer())[0]
+    logger = ListLogger()
+    queue = scope_dump_pro.RenderQueue(2, logger)
+    trace = scope_dump_pro.Trace()
+    trace.renderFile(None, logger, job, queue)
+    wait_for_files(trace)
+    for file_name in trace.files.values():
+        assert os.path.getsize(file_name)
+    assert not [name for name in os.listdir(output) if '.partial' in name]
+
+
+def test_converter_renders_off_the_event_loop(converter, output):
+    job = capture(b'Hello world, this is a plain text printout.\r\n\x0c', scope_dump_pro.AutoTokenizer())[0]
+    logger = ListLogger()
+
+    async def render():
+        queue = scope_dump_pro.AsyncRenderQueue(2, logger)
+        trace = scope_dump_pro.Trace()
+        await asyncio.gather(*trace.renderFile(None, logger, job, queue))
+        while queue.tasks or queue.calls:
+            await asyncio.gather(*queue.tasks, *queue.calls)
+        return trace
+
+    trace = asyncio.run(render())
+    for file_name in trace.files.values():
+        assert os.path.getsize(file_name)
+    assert not [name for name in os.listdir(output) if '.partial' in name]
+
+
+def test_depth_counts_jobs_being_prepared(converter, output):
+    job = capture(b'\x1bEfirst\x0c\x1bE', scope_dump_pro.PCLTokenizer())[0]
+    logger = ListLogger()
+    queue = scope_dump_pro.RenderQueue(1, logger)
+    busy = scope_dump_pro.Event()
+    queue.call(busy.wait)
+    trace = scope_dump_pro.Trace()
+    trace.renderFile(None, logger, job, queue)
+    assert queue.depth == 2
+    busy.set()
+    wait_for_files(trace)
+    deadline = time.monotonic() + 5
+    while queue.depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.depth == 0
+
+
+def test_stop_drops_queued_renders(converter, output, monkeypatch):
+    monkeypatch.setenv('CONVERTER_DELAY', '0.3')
+    monkeypatch.setattr(scope_dump_pro, 'THUMB_SIZE', 0)
+    logger = ListLogger()
+    queue = scope_dump_pro.RenderQueue(1, logger)
+    traces = []
+    for job in capture(b'\x1bEfirst\x0c\x1bE\x1bEsecond\x0c\x1bE\x1bEthird\x0c\x1bE', scope_dump_pro.PCLTokenizer()):
+        traces.append(scope_dump_pro.Trace())
+        traces[-1].renderFile(None, logger, job, queue)
+    time.sleep(0.1)
+    queue.stop()
+    rendered = [os.path.exists(file_name) for trace in traces for file_name in trace.files.values()]
+    assert any(rendered) and not all(rendered)
+    assert not [name for name in os.listdir(output) if '.partial' in name]
+    assert queue.depth == 0
+
+
+def test_async_stop_kills_converters(converter, output, monkeypatch):
+    monkeypatch.setenv('CONVERTER_DELAY', '5')
+    job = capture(b'\x1bEfirst\x0c\x1bE', scope_dump_pro.PCLTokenizer())[0]
+    logger = ListLogger()
+
+    async def render():
+        queue = scope_dump_pro.AsyncRenderQueue(2, logger)
+        trace = scope_dump_pro.Trace()
+        await asyncio.gather(*trace.renderFile(None, logger, job, queue))
+        await asyncio.sleep(0.3)
+        start = time.monotonic()
+        await queue.stop()
+        return time.monotonic() - start
+
+    assert asyncio.run(render()) < 2
+    assert not os.listdir(output)
+
+
+def test_thumbnail_from_pdf_without_extra_converter_run(converter, output, monkeypatch):
+    pytest.importorskip('fitz')
+    monkeypatch.setattr(scope_dump_pro, 'CONV_FORMAT', 'pdf')
+    job = capture(b'\x1bEfirst\x0c\x1bE', scope_dump_pro.PCLTokenizer())[0]
+    logger = ListLogger()
+    queue = scope_dump_pro.RenderQueue(1, logger)
+    trace = scope_dump_pro.Trace()
+    trace.renderFile(None, logger, job, queue)
+    wait_for_files(trace)
+    assert 'Queued job for rendering to PDF (1 in queue)' in logger.lines
+    assert queue.rendered == 1
+    with scope_dump_pro.Image.open(trace.files['thumb']) as thumb:
+        assert max(thumb.size) == 64
+        # the blank page got the phosphor look instead of staying white
+        assert thumb.convert('RGB').getpixel((0, 0)) == (0, 255, 0)
+
+
+def test_catalog_queries(tmp_path):
+    catalog = scope_dump_pro.TraceCatalog(str(tmp_path / 'catalog.sqlite'), ListLogger())
+    for number, port in ((20261018, 'ttyUSB0'), (20261019, 'ttyUSB1')):
+        job = scope_dump_pro.Job(data=b'job ' + str(number).encode(), size=12, language='PCL')
+        job.getHash()
+        preview = tmp_path / ('scope_output_' + str(number) + '.pdf')
+        preview.write_bytes(b'%PDF')
+        catalog.record(job, number, port, 0.1, {'pdf': str(preview)})
+    assert [row[2] for row in catalog.query()] == ['ttyUSB1', 'ttyUSB0']
+    # digits only are searched for in the file names, not taken for a hash
+    assert [row[2] for row in catalog.query(['20261018'])] == ['ttyUSB0']
+    job_hash = catalog.query(['ttyUSB1'])[0][5]
+    assert [row[2] for row in catalog.query(['#' + job_hash[:4]])] == ['ttyUSB1']
+    assert catalog.outputs(catalog.query(['ttyUSB1'])[0][0]) == [('pdf', str(tmp_path / 'scope_output_20261019.pdf'))]
+
+
+def test_catalog_pages(tmp_path):
+    catalog = scope_dump_pro.TraceCatalog(str(tmp_path / 'catalog.sqlite'), ListLogger())
+    # several jobs captured within the same second have to be paged by ID as well
+    for captured in (100, 101, 101, 101, 102, 103, 103):
+        job = scope_dump_pro.Job(data=b'job', size=3, language='PCL')
+        catalog.record(job, captured, 'ttyUSB0', 0.1, {})
+    pages = [catalog.query(limit=3)]
+    while pages[-1]:
+        pages.append(catalog.query(limit=3, after=pages[-1][-1]))
+    assert [len(page) for page in pages] == [3, 3, 1, 0]
+    rows = [row for page in pages for row in page]
+    assert [row[1] for row in rows] == [103, 103, 102, 101, 101, 101, 100]
+    assert len(set(row[0] for row in rows)) == 7
+    assert [row[0] for row in rows] == [row[0] for row in catalog.query()]
+
+
+def test_query_without_catalog_creates_nothing(tmp_path, monkeypatch, capsys):
+    missing = tmp_path / 'missing dir' / 'catalog.sqlite'
+    monkeypatch.setattr(scope_dump_pro, 'CATALOG_FILE', str(missing))
+    scope_dump_pro.listTraces('')
+    assert capsys.readouterr().out == 'No trace catalog at ' + str(missing) + '\n'
+    assert not os.listdir(tmp_path)
+    scope_dump_pro.TraceCatalog(str(missing)).connection.close()
+    scope_dump_pro.listTraces('')
+    assert capsys.readouterr().out.splitlines()[-1] == '0 traces in ' + str(missing)